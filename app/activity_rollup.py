@@ -0,0 +1,112 @@
+from models import Commits, DailyActivity, DeveloperActivity, DeveloperStats, RepoStats
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from stats_engine import REPO_STATS_ID
+
+import datetime
+
+
+def upsert_counts(session, table, key_columns, rows):
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c[column] for column in key_columns],
+                                      set_={'commits': table.c.commits + stmt.excluded.commits})
+    session.execute(stmt, rows)
+
+
+def add_commits_to_activity(session, commits):
+    """
+    Update the daily commit counters with newly stored commits.
+
+    The totals per developer and of the repository are the commit_count of DeveloperStats and RepoStats.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.Session
+        DB session used in ORM related operations
+    commits : list
+        Commits rows (dicts) of the new commits
+    """
+    days = {}
+    developer_days = {}
+    for commit in commits:
+        day = commit['timestamp'].date()
+        days[day] = days.get(day, 0) + 1
+        if commit['developer_id'] is not None:
+            key = (commit['developer_id'], day)
+            developer_days[key] = developer_days.get(key, 0) + 1
+    if days:
+        upsert_counts(session, DailyActivity.__table__, ['date'],
+                      [{'date': day, 'commits': count} for day, count in days.items()])
+    if developer_days:
+        upsert_counts(session, DeveloperActivity.__table__, ['developer_id', 'date'],
+                      [{'developer_id': dev_id, 'date': day, 'commits': count}
+                       for (dev_id, day), count in developer_days.items()])
+
+
+def activity_counts(session):
+    """
+    Count the commits per day and per developer and day from the stored commits.
+
+    Returns
+    -------
+    tuple
+        Day to commits and (developer id, day) to commits
+    """
+    day = func.date(Commits.timestamp)
+    days = {datetime.date.fromisoformat(date): count
+            for date, count in session.execute(select(day, func.count()).group_by(day))}
+    developer_days = {(dev_id, datetime.date.fromisoformat(date)): count
+                      for dev_id, date, count in session.execute(
+                          select(Commits.developer_id, day, func.count())
+                          .where(Commits.developer_id.isnot(None)).group_by(Commits.developer_id, day))}
+    return days, developer_days
+
+
+def rebuild_activity(session):
+    """
+    Rebuild the daily commit counters from the stored commits.
+    """
+    days, developer_days = activity_counts(session)
+    session.query(DailyActivity).delete()
+    session.query(DeveloperActivity).delete()
+    if days:
+        session.execute(DailyActivity.__table__.insert(),
+                        [{'date': day, 'commits': count} for day, count in days.items()])
+    if developer_days:
+        session.execute(DeveloperActivity.__table__.insert(),
+                        [{'developer_id': dev_id, 'date': day, 'commits': count}
+                         for (dev_id, day), count in developer_days.items()])
+    session.commit()
+
+
+def verify_activity(session):
+    """
+    Compare the maintained counters with counts from the stored commits.
+
+    Returns
+    -------
+    list
+        Description of every mismatch, empty when the rollup is consistent
+    """
+    days, developer_days = activity_counts(session)
+    mismatches = []
+    stored_days = dict(session.query(DailyActivity.date, DailyActivity.commits))
+    for day in sorted(set(days) | set(stored_days)):
+        if days.get(day, 0) != stored_days.get(day, 0):
+            mismatches.append('Day %s: %s commits, %s counted' % (day, days.get(day, 0), stored_days.get(day, 0)))
+    stored_developer_days = {(dev_id, day): count for dev_id, day, count in
+                             session.query(DeveloperActivity.developer_id, DeveloperActivity.date,
+                                           DeveloperActivity.commits)}
+    for key in sorted(set(developer_days) | set(stored_developer_days)):
+        if developer_days.get(key, 0) != stored_developer_days.get(key, 0):
+            mismatches.append('Developer %s on %s: %s commits, %s counted' % (
+                key + (developer_days.get(key, 0), stored_developer_days.get(key, 0))))
+    developer_totals = dict(session.query(Commits.developer_id, func.count()).group_by(Commits.developer_id))
+    for dev_id, count in session.query(DeveloperStats.developer_id, DeveloperStats.commit_count):
+        if developer_totals.get(dev_id, 0) != (count or 0):
+            mismatches.append('Developer %s: %s commits, %s in the stats' % (dev_id, developer_totals.get(dev_id, 0),
+                                                                             count))
+    repo_count = session.query(RepoStats.commit_count).filter(RepoStats.id == REPO_STATS_ID).scalar()
+    if sum(days.values()) != (repo_count or 0):
+        mismatches.append('Repository: %s commits, %s in the stats' % (sum(days.values()), repo_count))
+    return mismatches
@@ -1,95 +1,41 @@
-import json
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 import sqlite3
 
-from sklearn.svm import OneClassSVM
 from sklearn.metrics import f1_score
 from sklearn.preprocessing import StandardScaler, MinMaxScaler
-from numpy import where
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import func
-from datetime import datetime
 
+from behaviour_features import FEATURE_COLUMNS, dev_training_data, parse_commit_rows, parse_commits
+from db import get_engine
+from model_registry import MODELS_DIR, ModelRegistry, train_all
+from model_sweep import best_params, run_sweep
 from models import CommitsStats, Developer
 from rule_simulation import clever_commit
 
 import matplotlib.pyplot as plt
 import numpy as np
 import configparser
-import statistics
+import os
 
 # Configuration read
 config = configparser.ConfigParser()
 config.read('simulations.ini')
-# Database configuration
 DB_NAMES = config['Repository']['DB_Names'].split(',')
-print('Choose the database: ')
-print(DB_NAMES)
-DB_NAME = str(input('Database name: '))
-db_engine = create_engine('sqlite:///../' + DB_NAME)
-DBSession = sessionmaker(bind=db_engine)
+# Database configuration, bound by open_database
+DBSession = sessionmaker()
+model_registry = None
 np.set_printoptions(suppress=True)
 
 
-def get_mean_and_variance(values):
-    mean = 0
-    var = 0
-    if len(values) > 0:
-        mean = sum(values) / len(values)
-        if len(values) > 1:
-            var = statistics.variance(values)
-    return mean, var
-
-
-def parse_commits(commits):
-    changed_chars = []
-    changed_lines = []
-    commits_messages_len = []
-    timestamps = []
-    added_files = []
-    modified_files = []
-    removed_files = []
-    for commit in commits:
-        # timestamps.append(datetime.fromisoformat(commit['commit']['author']['date'][:-1]))
-        timestamps.append(datetime.fromisoformat(commit['commit']['author']['date']))
-        added = 0
-        modified = 0
-        removed = 0
-        for file in commit['files']:
-            if file['status'] == 'added':
-                added += 1
-            elif file['status'] == 'modified':
-                modified += 1
-            elif file['status'] == 'removed':
-                removed += 1
-            if 'patch' in file:
-                file_changes = file['patch'].split('\n')
-                for line_change in file_changes:
-                    if line_change[0] == '+' or line_change[0] == '-':
-                        changed_chars.append(len(line_change))
-        added_files.append(added)
-        modified_files.append(modified)
-        removed_files.append(removed)
-        commits_messages_len.append(len(commit['commit']['message']))
-        changed_lines.append(commit['stats']['total'])
-
-    lines_mean, lines_var = get_mean_and_variance(changed_lines)
-    changed_chars_mean, changed_chars_var = get_mean_and_variance(changed_chars)
-    time_intervals = []
-    if len(timestamps) > 1:
-        for i in range(0, len(timestamps)):
-            if len(timestamps) == i + 1:
-                break
-            delta = timestamps[i] - timestamps[i + 1]
-            time_intervals.append(delta.total_seconds())
-    times_mean, times_variance = get_mean_and_variance(time_intervals)
-    comments_size_mean, comments_size_var = get_mean_and_variance(commits_messages_len)
-    added_files_mean, added_files_var = get_mean_and_variance(added_files)
-    modified_files_mean, modified_files_var = get_mean_and_variance(modified_files)
-    removed_files_mean, removed_files_var = get_mean_and_variance(removed_files)
-    return np.asarray([(times_mean, len(commits), changed_chars_mean, changed_chars_var, lines_mean, lines_var,
-                        min(changed_lines), max(changed_lines), comments_size_mean, comments_size_var, added_files_mean,
-                        added_files_var, modified_files_mean, modified_files_var, removed_files_mean, removed_files_var)])
+def open_database(db_name):
+    """
+    Use one of the repository databases, the models of each database are kept apart as developer ids are only unique
+    within a database.
+    """
+    global model_registry
+    DBSession.configure(bind=get_engine('sqlite:///../' + db_name))
+    model_registry = ModelRegistry(os.path.join(MODELS_DIR, os.path.basename(db_name)))
 
 
 def create_graph_commits(username):
@@ -137,16 +83,7 @@ def create_graph_commits(username):
 
 def get_dev_commits_stats(username):
     with DBSession() as session:
-        stats = session.query(func.round(CommitsStats.time_intervals_mean, 4), CommitsStats.number_commits,
-                              func.round(CommitsStats.changed_chars_mean), func.round(CommitsStats.changed_chars_var),
-                              func.round(CommitsStats.changed_lines_mean), func.round(CommitsStats.changed_lines_var),
-                              func.round(CommitsStats.changed_lines_min), func.round(CommitsStats.changed_lines_max),
-                              func.round(CommitsStats.comments_size_mean), func.round(CommitsStats.comments_size_var),
-                              func.round(CommitsStats.added_files_mean), func.round(CommitsStats.added_files_var),
-                              func.round(CommitsStats.modified_files_mean), func.round(CommitsStats.modified_files_var),
-                              func.round(CommitsStats.removed_files_mean), func.round(CommitsStats.removed_files_var))\
-            .join(Developer).filter(Developer.username == username).order_by(CommitsStats.date).all()
-    data = np.asarray(stats)
+        data = dev_training_data(session, username=username)
     #scaler = StandardScaler()
     scaler = MinMaxScaler()
     scaler.fit(data)
@@ -154,11 +91,14 @@ def get_dev_commits_stats(username):
 
 
 def analyze_user_behaviour(username, data):
-    dev_stats = get_dev_commits_stats(username)
-    # Create user model
-    svm_user = OneClassSVM(kernel='poly', gamma='auto', nu=0.1)
-    svm_user.fit(dev_stats)
-    result = svm_user.predict(data)
+    # The user model is trained once and reused while the daily stats of the user do not change
+    with DBSession() as session:
+        developer_id = session.query(Developer.id).filter(Developer.username == username).scalar()
+        user_model = model_registry.get(session, developer_id) if developer_id is not None else None
+    if user_model is None:
+        print('There are not enough commits of ' + username + ' to model the user behaviour.')
+        return None
+    result = user_model.model.predict(user_model.scaler.transform(data))
     print('This commit is ' + ('an ANOMALY' if result == -1 else 'NOT an ANOMALY') + ' within the ' + username + ' user behaviour on the repository.')
     return result
 
@@ -169,116 +109,121 @@ def predict_over_rules(username):
     return analyze_user_behaviour(username, parsed_commit)
 
 
-def model(train, predict, kernel, gamma, nu):
-    svm_user = OneClassSVM(kernel=kernel, gamma=gamma, nu=nu)
-    print('Training ...')
-    svm_user.fit(train)
-    print('Predict ...')
-    predict = svm_user.predict(predict)
-    tp = len(where(predict == 1)[0])
-    fp = len(where(predict == -1)[0])
-    train_pred = svm_user.predict(train)
-    print('Accuracy: ' + str((tp / predict.shape[0]) * 100))
-    print('FP rate: ' + str((fp / predict.shape[0]) * 100))
-    print('F1 Score: ' + str(f1_score(train_pred, predict) * 100))
-
-
-def split_array(data):
-    split_stats = None
-    if len(data) > 3:
-        try:
-            split_stats = np.split(data, 2)
-        except ValueError:
-            rows = data.shape[0]
-            index = int(rows/2)
-            split_stats = [data[:index][:]]
-            split_stats.append(data[index:-1][:])
-    else:
-        split_stats = [data]
-        split_stats.append(data)
-    return split_stats
-
-
-def divide_train_predict(username):
-    _, dev_stats = get_dev_commits_stats(username)
-    split_stats = None
-    if len(dev_stats) > 3:
-        try:
-            split_stats = np.split(dev_stats, 2)
-        except ValueError:
-            rows = dev_stats.shape[0]
-            index = int(rows/2)
-            split_stats = [dev_stats[:index][:]]
-            split_stats.append(dev_stats[index:-1][:])
-    else:
-        split_stats = [dev_stats]
-        split_stats.append(dev_stats)
-    print('########## Gamma auto and nu 0.1')
-    print('#################################')
-    print('Kernel RBF, gamma auto, nu 0.1')
-    model(split_stats[0], split_stats[1], 'rbf', 'auto', 0.1)
-
-    print('#################################')
-    print('Kernel Polynomial, gamma auto, nu 0.1')
-    model(split_stats[0], split_stats[1], 'poly', 'auto', 0.1)
-
-    print('#################################')
-    print('Kernel Sigmoid, gamma auto, nu 0.1')
-    model(split_stats[0], split_stats[1], 'sigmoid', 'auto', 0.1)
-
-    print('#################################')
-    print('Kernel Linear, gamma auto, nu 0.1')
-    model(split_stats[0], split_stats[1], 'linear', 'auto', 0.1)
-
-    print('########## Gamma scale and nu 0.1')
-    print('#################################')
-    print('Kernel RBF, gamma scale, nu 0.1')
-    model(split_stats[0], split_stats[1], 'rbf', 'scale', 0.1)
-
-    print('#################################')
-    print('Kernel Polynomial, gamma scale, nu 0.1')
-    model(split_stats[0], split_stats[1], 'poly', 'scale', 0.1)
-
-    print('#################################')
-    print('Kernel Sigmoid, gamma scale, nu 0.1')
-    model(split_stats[0], split_stats[1], 'sigmoid', 'scale', 0.1)
-
-    print('#################################')
-    print('Kernel Linear, gamma scale, nu 0.2')
-    model(split_stats[0], split_stats[1], 'linear', 'scale', 0.2)
-
-
-usernames = ['Lukasa']
-
-for username in usernames:
-    print('User: ' + username)
-    scaler, dev_stats = get_dev_commits_stats(username)
-    # Create user model
-    svm_user = OneClassSVM(kernel='poly', gamma='auto', nu=0.1)
-    print('Training...')
-    svm_user.fit(dev_stats)
-
-    con = sqlite3.connect('results/forged_commits-clever-' + username + '.db')
-    #con = sqlite3.connect('results/forged_commits-dumb-' + username + '.db')
-    cursor = con.cursor()
-    cursor.execute('SELECT commit_data FROM forged_commits')
-    all_obj = cursor.fetchall()
-
-    fp = []
-    tp = []
-    predict = []
-
+def sweep_hyperparameters(grid=None, workers=None):
+    """
+    Evaluate a parameter grid (see model_sweep.DEFAULT_GRID) for every developer and print the best combination of each.
+    """
+    with DBSession() as session:
+        usernames = dict(session.query(Developer.id, Developer.username))
+        sweep_id = run_sweep(session, grid, workers)
+        for developer_id, result in best_params(session, sweep_id).items():
+            print('%s: kernel %s, gamma %s, nu %s, %s scaler, %s features - FP rate %.1f' % (
+                usernames.get(developer_id), result.kernel, result.gamma, result.nu, result.scaler, result.features,
+                result.fp_rate))
+    print('Sweep %s stored in the sweep_result table' % sweep_id)
+    return sweep_id
+
+
+def read_chunks(cursor, chunk_size):
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield [row[0] for row in rows]
+
+
+def forged_commits_features(forged_db, chunk_size=1000, workers=None):
+    """
+    Get the behaviour features of every forged commit, streaming the rows in chunks parsed by a process pool.
+
+    Returns
+    -------
+    numpy.ndarray
+        Features of each forged commit, one row per commit
+    """
+    con = sqlite3.connect(forged_db)
+    cursor = con.execute('SELECT commit_data FROM forged_commits ORDER BY id')
+    features = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        # At most two chunks per worker are read ahead, so memory does not grow with the table
+        max_pending = 2 * (workers or os.cpu_count() or 1)
+        for chunk in read_chunks(cursor, chunk_size):
+            pending.append(executor.submit(parse_commit_rows, chunk))
+            if len(pending) >= max_pending:
+                features.append(pending.popleft().result())
+        while pending:
+            features.append(pending.popleft().result())
+    con.close()
+    if not features:
+        return np.empty((0, len(FEATURE_COLUMNS)))
+    return np.vstack(features)
+
+
+def evaluate_forged_commits(username, forged_db, chunk_size=1000, workers=None):
+    """
+    Score every forged commit against the user model with a single transform and predict.
+
+    Every forged commit should be an anomaly (-1): accuracy is the share of forged commits detected, the FP rate the
+    share taken as normal behaviour and the F1 score takes anomalies as the positive class.
+
+    Returns
+    -------
+    dict
+        Number of commits, accuracy, FP rate and F1 score (percentages), None without a user model
+    """
+    with DBSession() as session:
+        developer_id = session.query(Developer.id).filter(Developer.username == username).scalar()
+        user_model = model_registry.get(session, developer_id) if developer_id is not None else None
+    if user_model is None:
+        print('There are not enough commits of ' + username + ' to model the user behaviour.')
+        return None
     print('Predict..')
-    for tmp in all_obj:
-        forged_commit = json.loads(tmp[0])
-        parsed_commit = parse_commits([forged_commit])
-        result = svm_user.predict(scaler.transform(parsed_commit))
-        predict.append(result)
-
-    predict = np.array(predict)
-    tp = len(where(predict == -1)[0])
-    fp = len(where(predict == 1)[0])
-    print('Accuracy: ' + str(tp/500 * 100))
-    print('FP rate: ' + str(fp/500 * 100))
-    print('F1 Score: ' + str(f1_score(np.full(500, 1), predict) * 100))
-
+    features = forged_commits_features(forged_db, chunk_size, workers)
+    total = len(features)
+    if total == 0:
+        return {'commits': 0, 'accuracy': None, 'fp_rate': None, 'f1': None}
+    predict = user_model.model.predict(user_model.scaler.transform(features))
+    tp = int(np.count_nonzero(predict == -1))
+    fp = total - tp
+    return {'commits': total, 'accuracy': tp / total * 100, 'fp_rate': fp / total * 100,
+            'f1': f1_score(np.full(total, -1), predict, pos_label=-1) * 100}
+
+
+def train_all_models(workers=None):
+    """
+    Train the model of every developer with enough daily stats, skipping the ones whose data did not change, and
+    print the per developer report.
+    """
+    with DBSession() as session:
+        usernames = dict(session.query(Developer.id, Developer.username))
+        report = train_all(session, model_registry.directory, model_registry.params, workers)
+    for entry in sorted(report, key=lambda entry: entry['developer_id']):
+        line = '%s: %s, %s samples' % (usernames.get(entry['developer_id']), entry['status'], entry['samples'])
+        if entry['fit_time'] is not None:
+            line += ', fit in %.3f seconds' % entry['fit_time']
+        if entry['error']:
+            line += ', ' + entry['error']
+        print(line)
+    counts = Counter(entry['status'] for entry in report)
+    print('Trained %s, skipped %s (unchanged), failed %s' % (counts['trained'], counts['skipped'], counts['failed']))
+    return report
+
+
+if __name__ == '__main__':
+    print('Choose the database: ')
+    print(DB_NAMES)
+    open_database(str(input('Database name: ')))
+    train_all_models()
+    #sweep_hyperparameters()
+    usernames = ['Lukasa']
+
+    for username in usernames:
+        print('User: ' + username)
+        metrics = evaluate_forged_commits(username, 'results/forged_commits-clever-' + username + '.db')
+        #metrics = evaluate_forged_commits(username, 'results/forged_commits-dumb-' + username + '.db')
+        if metrics and metrics['commits']:
+            print('Forged commits: ' + str(metrics['commits']))
+            print('Accuracy: ' + str(metrics['accuracy']))
+            print('FP rate: ' + str(metrics['fp_rate']))
+            print('F1 Score: ' + str(metrics['f1']))
@@ -0,0 +1,149 @@
+from models import Commits, DeveloperStats, RepoStats
+from stats_engine import STATS_ATTRIBUTES, REPO_STATS_ID, stats_fingerprint
+
+import threading
+import numpy as np
+
+
+def commit_metrics(commits_data):
+    """
+    Get the STATS_ATTRIBUTES values of commits from the GitHub API, one row per commit.
+    """
+    values = np.zeros((len(commits_data), len(STATS_ATTRIBUTES)))
+    for i, commit_data in enumerate(commits_data):
+        statuses = [file['status'] for file in commit_data['files']]
+        values[i] = (commit_data['stats']['additions'], commit_data['stats']['deletions'], statuses.count('added'),
+                     statuses.count('modified'), statuses.count('removed'))
+    return values
+
+
+class Baselines:
+    """
+    Means and standard deviations of every developer and of the repository, one row per baseline and one column per
+    attribute of STATS_ATTRIBUTES.
+
+    Rows without stats (e.g. developers without commits) are NaN, so they never flag a commit.
+    """
+
+    def __init__(self, developer_ids, means, stds):
+        self.index = {dev_id: i for i, dev_id in enumerate(developer_ids)}
+        self.means = means
+        self.stds = stds
+        self.repo_row = len(developer_ids)
+        self.unknown_row = len(developer_ids) + 1
+
+    def rows(self, developer_ids):
+        return np.array([self.index.get(dev_id, self.unknown_row) for dev_id in developer_ids], dtype=int)
+
+    def zscores(self, values, rows):
+        diff = values - self.means[rows]
+        stds = self.stds[rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # A difference from a constant baseline is infinitely far from it
+            return np.where(stds == 0, np.sign(diff) * np.where(diff == 0, 0, np.inf), diff / stds)
+
+    def deviations(self, developer_ids, values):
+        """
+        Get the deviations of commits from the baselines of their developers and from the repository baselines.
+
+        Parameters
+        ----------
+        developer_ids : list
+            Developer of each commit, None (or an unknown id) when the developer has no baselines
+        values : numpy.ndarray
+            STATS_ATTRIBUTES values, one row per commit
+
+        Returns
+        -------
+        tuple
+            Signed deviations, in standard deviations, from the developer baselines (NaN without them) and from the
+            repository baselines, both with one row per commit and one column per attribute
+        """
+        values = np.asarray(values, dtype=float).reshape(-1, len(STATS_ATTRIBUTES))
+        developer = self.zscores(values, self.rows(developer_ids))
+        repo = self.zscores(values, np.full(len(values), self.repo_row))
+        return developer, repo
+
+    def outliers(self, developer_ids, values, band=1.0):
+        """
+        Get whether each commit is out of the band (avg ± band * std) of any attribute, for its developer or the
+        repository.
+        """
+        return out_of_band(*self.deviations(developer_ids, values), band)
+
+
+def out_of_band(developer, repo, band=1.0):
+    """
+    Get whether each commit deviates more than band standard deviations in any attribute, from the developer or the
+    repository baselines.
+    """
+    with np.errstate(invalid='ignore'):
+        return (np.abs(developer) > band).any(axis=1) | (np.abs(repo) > band).any(axis=1)
+
+
+def load_baselines(session):
+    avg_columns = [getattr(DeveloperStats, attr + '_avg') for attr in STATS_ATTRIBUTES]
+    std_columns = [getattr(DeveloperStats, attr + '_std') for attr in STATS_ATTRIBUTES]
+    rows = session.query(DeveloperStats.developer_id, *avg_columns, *std_columns).all()
+    repo_stats = session.get(RepoStats, REPO_STATS_ID)
+    repo_row = [None] * len(STATS_ATTRIBUTES) * 2
+    if repo_stats is not None:
+        repo_row = [getattr(repo_stats, attr + suffix) for suffix in ('_avg', '_std') for attr in STATS_ATTRIBUTES]
+    # Developers, then the repository and a NaN row for developers without stats
+    table = np.array([row[1:] for row in rows] + [repo_row, [None] * len(repo_row)], dtype=float)
+    means, stds = table[:, :len(STATS_ATTRIBUTES)], table[:, len(STATS_ATTRIBUTES):]
+    stds[np.isnan(means)] = np.nan
+    return Baselines([row[0] for row in rows], means, stds)
+
+
+class BaselineCache:
+    """
+    Baselines kept in memory between pushes, loaded again when the stats fingerprint changes.
+    """
+
+    def __init__(self):
+        self.fingerprint = None
+        self.baselines = None
+        self.lock = threading.Lock()
+
+    def get(self, session):
+        fingerprint = stats_fingerprint(session)
+        with self.lock:
+            if self.baselines is None or fingerprint != self.fingerprint:
+                self.baselines = load_baselines(session)
+                self.fingerprint = fingerprint
+            return self.baselines
+
+
+# Baselines shared by every session of the process
+baseline_cache = BaselineCache()
+
+
+def replay_outliers(session, band=1.0, start=None, end=None):
+    """
+    Score the stored commits against the current baselines in a single vectorized pass, e.g. to backtest the outlier
+    rule over the history.
+
+    Parameters
+    ----------
+    start : datetime.datetime
+        Only commits since this timestamp, all by default
+    end : datetime.datetime
+        Only commits before this timestamp, all by default
+
+    Returns
+    -------
+    tuple
+        Commit ids, developer and repository deviations (as in Baselines.deviations) and the outlier flags
+    """
+    query = session.query(Commits.id, Commits.developer_id, *[getattr(Commits, attr) for attr in STATS_ATTRIBUTES])
+    if start is not None:
+        query = query.filter(Commits.timestamp >= start)
+    if end is not None:
+        query = query.filter(Commits.timestamp < end)
+    rows = query.order_by(Commits.id).all()
+    baselines = baseline_cache.get(session)
+    values = np.array([row[2:] for row in rows], dtype=float).reshape(-1, len(STATS_ATTRIBUTES))
+    values = np.nan_to_num(values)
+    developer, repo = baselines.deviations([row[1] for row in rows], values)
+    return [row[0] for row in rows], developer, repo, out_of_band(developer, repo, band)
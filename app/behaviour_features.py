@@ -0,0 +1,109 @@
+from diff_stats import commit_diff_stats
+from models import CommitsStats, Developer
+from sqlalchemy import func
+from utils import get_mean_and_variance
+from datetime import datetime
+from itertools import groupby
+
+import numpy as np
+import json
+
+# Daily stats of a developer used as behaviour features, in the order produced by parse_commits
+FEATURE_COLUMNS = (
+    func.round(CommitsStats.time_intervals_mean, 4), CommitsStats.number_commits,
+    func.round(CommitsStats.changed_chars_mean), func.round(CommitsStats.changed_chars_var),
+    func.round(CommitsStats.changed_lines_mean), func.round(CommitsStats.changed_lines_var),
+    func.round(CommitsStats.changed_lines_min), func.round(CommitsStats.changed_lines_max),
+    func.round(CommitsStats.comments_size_mean), func.round(CommitsStats.comments_size_var),
+    func.round(CommitsStats.added_files_mean), func.round(CommitsStats.added_files_var),
+    func.round(CommitsStats.modified_files_mean), func.round(CommitsStats.modified_files_var),
+    func.round(CommitsStats.removed_files_mean), func.round(CommitsStats.removed_files_var))
+
+
+def parse_commits(commits):
+    """
+    Summarize commits from the GitHub API into a row of behaviour features, as the daily stats of a developer.
+    """
+    changed_chars = []
+    changed_lines = []
+    commits_messages_len = []
+    timestamps = []
+    added_files = []
+    modified_files = []
+    removed_files = []
+    for commit in commits:
+        # GitHub API dates end with Z, not understood by fromisoformat before Python 3.11
+        timestamps.append(datetime.fromisoformat(commit['commit']['author']['date'].replace('Z', '+00:00')))
+        diff_stats = commit_diff_stats(commit['files'], line_lengths=True)
+        changed_chars.extend(diff_stats['changed_line_lengths'])
+        added_files.append(diff_stats['added'])
+        modified_files.append(diff_stats['modified'])
+        removed_files.append(diff_stats['removed'])
+        commits_messages_len.append(len(commit['commit']['message']))
+        changed_lines.append(commit['stats']['total'])
+
+    lines_mean, lines_var = get_mean_and_variance(changed_lines)
+    changed_chars_mean, changed_chars_var = get_mean_and_variance(changed_chars)
+    time_intervals = [(timestamps[i] - timestamps[i + 1]).total_seconds() for i in range(len(timestamps) - 1)]
+    times_mean, times_variance = get_mean_and_variance(time_intervals)
+    comments_size_mean, comments_size_var = get_mean_and_variance(commits_messages_len)
+    added_files_mean, added_files_var = get_mean_and_variance(added_files)
+    modified_files_mean, modified_files_var = get_mean_and_variance(modified_files)
+    removed_files_mean, removed_files_var = get_mean_and_variance(removed_files)
+    return np.asarray([(times_mean, len(commits), changed_chars_mean, changed_chars_var, lines_mean, lines_var,
+                        min(changed_lines), max(changed_lines), comments_size_mean, comments_size_var, added_files_mean,
+                        added_files_var, modified_files_mean, modified_files_var, removed_files_mean, removed_files_var)])
+
+
+def parse_commit_rows(commits_json):
+    """
+    Get the behaviour features of each commit given as a GitHub API JSON string, one row per commit.
+
+    Run in worker processes by the batch evaluations, so it only depends on its arguments.
+    """
+    if not commits_json:
+        return np.empty((0, len(FEATURE_COLUMNS)))
+    return np.vstack([parse_commits([json.loads(commit_json)]) for commit_json in commits_json])
+
+
+def dev_training_data(session, developer_id=None, username=None):
+    """
+    Get the behaviour features of every day with commits of a developer, by id or by username, ordered by date.
+    """
+    query = session.query(*FEATURE_COLUMNS)
+    if developer_id is not None:
+        query = query.filter(CommitsStats.developer_id == developer_id)
+    else:
+        query = query.join(Developer).filter(Developer.username == username)
+    data = np.asarray(query.order_by(CommitsStats.date).all(), dtype=float).reshape(-1, len(FEATURE_COLUMNS))
+    # Stats missing in a day (NULL) are taken as 0
+    return np.nan_to_num(data)
+
+
+def all_training_data(session, min_samples=1):
+    """
+    Get the behaviour features of every developer with at least min_samples days with commits.
+
+    Returns
+    -------
+    dict
+        Developer id to the features of each day, ordered by date
+    """
+    developers = session.query(CommitsStats.developer_id).filter(CommitsStats.developer_id.isnot(None))\
+        .group_by(CommitsStats.developer_id).having(func.count(CommitsStats.id) >= min_samples)
+    rows = session.query(CommitsStats.developer_id, *FEATURE_COLUMNS)\
+        .filter(CommitsStats.developer_id.in_(developers.scalar_subquery()))\
+        .order_by(CommitsStats.developer_id, CommitsStats.date).all()
+    data = {}
+    for developer_id, developer_rows in groupby(rows, key=lambda row: row[0]):
+        data[developer_id] = np.nan_to_num(np.asarray([row[1:] for row in developer_rows], dtype=float))
+    return data
+
+
+def training_fingerprint(session, developer_id):
+    """
+    Get a cheap value that changes whenever the daily stats of a developer change.
+    """
+    return tuple(session.query(func.count(CommitsStats.id), func.max(CommitsStats.id), func.max(CommitsStats.date),
+                               func.sum(CommitsStats.number_commits))
+                 .filter(CommitsStats.developer_id == developer_id).one())
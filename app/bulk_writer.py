@@ -0,0 +1,243 @@
+from activity_rollup import add_commits_to_activity
+from contribution_index import add_commits_to_contributions, rebuild_file_contributions
+from models import Commits, File, CommitsFiles, FileRename
+from sqlalchemy import bindparam, delete, func, update
+from sqlalchemy.dialects.sqlite import insert
+from stats_engine import add_commits_to_stats
+
+import time
+
+# Max. values in an IN clause, below the SQLite limit of host parameters
+IN_CHUNK_SIZE = 500
+
+
+def chunks(values, size=IN_CHUNK_SIZE):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+class BulkWriter:
+    """
+    Buffers parsed commits, file rows, file renames and file associations and writes them with executemany inserts, in
+    a single transaction per flush.
+
+    Every flush takes the database write lock before reading anything, so concurrent writers (e.g. webhook workers
+    and a backfill) are serialized: ids are assigned from the stored maximums at that point, commits stored by another
+    writer since they were buffered are dropped, and new files already stored by another writer reuse its row.
+    Commits stored without a SHA by versions before commits.sha get the SHA of the matching buffered commit instead
+    of being stored again.
+    Stored file rows merged by the file index are removed, their associations and renames moved to the kept row.
+    DeveloperStats, RepoStats, the developer-file contribution index and the daily activity counters are updated with
+    the written commits in the same transaction.
+    """
+
+    def __init__(self, session, file_index, batch_size=1000, preload_shas=True):
+        self.session = session
+        self.file_index = file_index
+        self.batch_size = batch_size
+        # Small writes (e.g. a single webhook commit) check the stored SHAs in the DB instead
+        self.preload_shas = preload_shas
+        self.shas = {sha for sha, in session.query(Commits.sha) if sha} if preload_shas else set()
+        self.commits = []
+        self.associations = []
+        self.rows = 0
+        self.write_time = 0.0
+        self.start_time = time.time()
+
+    def has_commit(self, sha):
+        if sha in self.shas:
+            return True
+        return not self.preload_shas and self.session.query(Commits.id).filter_by(sha=sha).first() is not None
+
+    def add_commit(self, commit, associations):
+        """
+        Buffer a commit row and its file associations, flushing when the buffer is full.
+
+        Parameters
+        ----------
+        commit : dict
+            Commits row without id, the id is set by the writer when flushing
+        associations : list
+            File row ('file') and status of each file changed by the commit, as returned by utils.save_file_changes
+        """
+        self.commits.append(commit)
+        self.shas.add(commit['sha'])
+        for association in associations:
+            association['commit'] = commit
+        self.associations.extend(associations)
+        if len(self.commits) >= self.batch_size:
+            self.flush()
+        return commit
+
+    def flush(self):
+        """
+        Write the buffered rows and commit the session transaction, together with any pending ORM change.
+        """
+        start_time = time.time()
+        self.lock()
+        new_files, changed_files, renames, merges = self.file_index.drain()
+        new_files, changed_files = self.assign_file_ids(new_files, changed_files)
+        commits = self.assign_commit_ids()
+        target = self.file_index.target
+        associations = {}
+        for association in self.associations:
+            if association['commit']['id'] is not None:
+                # Two buffered rows of the same commit can have been merged into one file
+                key = (association['commit']['id'], target(association['file'])['id'])
+                associations.setdefault(key, {'commit_id': key[0], 'file_id': key[1], 'status': association['status']})
+        associations = list(associations.values())
+        renames = [{'file_id': target(rename['file'])['id'], 'previous_filename': rename['previous_filename'],
+                    'filename': rename['filename'], 'renamed_at': rename['renamed_at']} for rename in renames]
+        if new_files:
+            self.session.execute(File.__table__.insert(), new_files)
+        if changed_files:
+            self.session.execute(File.__table__.update().where(File.id == bindparam('b_id')).values(
+                filename=bindparam('b_filename'), previous_filename=bindparam('b_previous_filename'),
+                renamed_at=bindparam('b_renamed_at'), developer_id=bindparam('b_developer_id')),
+                [{'b_id': file['id'], 'b_filename': file['filename'], 'b_previous_filename': file['previous_filename'],
+                  'b_renamed_at': file['renamed_at'], 'b_developer_id': file['developer_id']}
+                 for file in changed_files])
+        if merges:
+            self.merge_files(merges)
+        if renames:
+            # A rename stored by another writer since it was buffered is kept once
+            self.session.execute(insert(FileRename.__table__).on_conflict_do_nothing(), renames)
+        if commits:
+            self.session.execute(Commits.__table__.insert(), commits)
+        if associations:
+            self.session.execute(CommitsFiles.__table__.insert(), associations)
+        add_commits_to_stats(self.session, commits)
+        add_commits_to_contributions(self.session, commits, associations)
+        add_commits_to_activity(self.session, commits)
+        self.session.commit()
+        self.rows += len(new_files) + len(changed_files) + len(renames) + len(commits) + len(associations)
+        self.commits = []
+        self.associations = []
+        self.write_time += time.time() - start_time
+        print('Written %s rows (%.0f rows/s overall, %.0f rows/s writing)' % self.throughput(), end='\033[K\r')
+
+    def lock(self):
+        """
+        Take the SQLite write lock, held until the session transaction ends.
+        """
+        connection = self.session.connection()
+        # Without a write the driver has not begun a transaction yet, with one the lock is already held
+        if not connection.connection.in_transaction:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+    def assign_file_ids(self, new_files, changed_files):
+        """
+        Give the new file rows the id of the file stored with the same filename by another writer, or a new id.
+
+        Returns
+        -------
+        tuple
+            File rows to insert and file rows to update
+        """
+        stored = {}
+        for filenames in chunks({file['filename'] for file in new_files}):
+            for file_id, filename, previous_filename, renamed_at, developer_id in self.session.query(
+                    File.id, File.filename, File.previous_filename, File.renamed_at, File.developer_id)\
+                    .filter(File.filename.in_(filenames)).order_by(File.id):
+                stored[filename] = (file_id, previous_filename, renamed_at, developer_id)
+        last_id = self.session.query(func.max(File.id)).scalar() or 0
+        inserted = []
+        changed_files = list(changed_files)
+        for file in new_files:
+            if file['filename'] in stored:
+                file_id, previous_filename, renamed_at, developer_id = stored[file['filename']]
+                if not file['previous_filename']:
+                    file.update(previous_filename=previous_filename, renamed_at=renamed_at)
+                file.update(id=file_id, developer_id=file['developer_id'] or developer_id)
+                changed_files.append(file)
+            else:
+                last_id += 1
+                file['id'] = last_id
+                inserted.append(file)
+        return inserted, changed_files
+
+    def merge_files(self, merges):
+        """
+        Move the associations and renames of the merged stored file rows to the kept rows, then delete the merged rows
+        and rebuild the contribution index of the kept ones.
+
+        Parameters
+        ----------
+        merges : list
+            Id of the merged row and kept file row, as returned by FileIndex.drain
+        """
+        rows = [{'b_merged_id': merged_id, 'b_kept_id': kept['id']} for merged_id, kept in merges]
+        merged_ids = [merged_id for merged_id, kept in merges]
+        for table in (CommitsFiles.__table__, FileRename.__table__):
+            # Rows already linked to the kept file (e.g. a commit changing both filenames) are deleted with the merged
+            # ones
+            self.session.execute(update(table).prefix_with('OR IGNORE').where(
+                table.c.file_id == bindparam('b_merged_id')).values(file_id=bindparam('b_kept_id')), rows)
+            for ids in chunks(merged_ids):
+                self.session.execute(delete(table).where(table.c.file_id.in_(ids)))
+        for ids in chunks(merged_ids):
+            self.session.execute(delete(File.__table__).where(File.id.in_(ids)))
+        for ids in chunks(merged_ids + [kept['id'] for merged_id, kept in merges]):
+            rebuild_file_contributions(self.session, ids)
+
+    def assign_commit_ids(self):
+        """
+        Give the buffered commits their ids, leaving out the ones stored by another writer since they were buffered
+        and the ones stored before commits.sha existed.
+
+        Returns
+        -------
+        list
+            Commit rows to insert
+        """
+        stored = set()
+        for shas in chunks({commit['sha'] for commit in self.commits if commit['sha']}):
+            stored.update(sha for sha, in self.session.query(Commits.sha).filter(Commits.sha.in_(shas)))
+        commits = self.backfill_shas([commit for commit in self.commits if commit['sha'] not in stored])
+        for commit in self.commits:
+            commit['id'] = None
+        last_id = self.session.query(func.max(Commits.id)).scalar() or 0
+        for commit in commits:
+            last_id += 1
+            commit['id'] = last_id
+        return commits
+
+    def backfill_shas(self, commits):
+        """
+        Set the SHA of the commits stored without one (before commits.sha existed), matched to the buffered commits by
+        developer, timestamp and message, so they are not stored and counted again.
+
+        Returns
+        -------
+        list
+            Buffered commits without a stored match
+        """
+        if self.session.query(Commits.id).filter(Commits.sha.is_(None)).first() is None:
+            return commits
+        unnamed = {}
+        for timestamps in chunks({commit['timestamp'] for commit in commits}):
+            for commit_id, developer_id, timestamp, message in self.session.query(
+                    Commits.id, Commits.developer_id, Commits.timestamp, Commits.message)\
+                    .filter(Commits.sha.is_(None), Commits.timestamp.in_(timestamps)).order_by(Commits.id):
+                unnamed.setdefault((developer_id, timestamp, message), []).append(commit_id)
+        backfilled = []
+        remaining = []
+        for commit in commits:
+            ids = unnamed.get((commit['developer_id'], commit['timestamp'], commit['message']))
+            if ids:
+                backfilled.append({'b_id': ids.pop(0), 'b_sha': commit['sha']})
+            else:
+                remaining.append(commit)
+        if backfilled:
+            self.session.execute(Commits.__table__.update().where(Commits.id == bindparam('b_id'))
+                                 .values(sha=bindparam('b_sha')), backfilled)
+        return remaining
+
+    def throughput(self):
+        """
+        Get the rows written, the overall ingestion rate and the DB write rate, both in rows per second.
+        """
+        elapsed = time.time() - self.start_time
+        return (self.rows, self.rows / elapsed if elapsed else 0.0,
+                self.rows / self.write_time if self.write_time else 0.0)
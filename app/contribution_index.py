@@ -0,0 +1,78 @@
+from models import Commits, CommitsFiles, DeveloperFiles
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+
+
+def add_commits_to_contributions(session, commits, associations):
+    """
+    Update the developer-file contribution index with newly stored commits.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.Session
+        DB session used in ORM related operations
+    commits : list
+        Commits rows (dicts) of the new commits
+    associations : list
+        CommitsFiles rows (dicts) of the new commits
+    """
+    commits = {commit['id']: commit for commit in commits}
+    contributions = {}
+    for association in associations:
+        commit = commits[association['commit_id']]
+        if commit['developer_id'] is None:
+            continue
+        key = (commit['developer_id'], association['file_id'])
+        lines = commit['new_lines'] + commit['removed_lines']
+        row = contributions.get(key)
+        if row is None:
+            contributions[key] = {'developer_id': key[0], 'file_id': key[1], 'touches': 1, 'lines_changed': lines,
+                                  'first_seen': commit['timestamp'], 'last_seen': commit['timestamp']}
+        else:
+            row['touches'] += 1
+            row['lines_changed'] += lines
+            row['first_seen'] = min(row['first_seen'], commit['timestamp'])
+            row['last_seen'] = max(row['last_seen'], commit['timestamp'])
+    if not contributions:
+        return
+    table = DeveloperFiles.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.developer_id, table.c.file_id], set_={
+        'touches': table.c.touches + stmt.excluded.touches,
+        'lines_changed': table.c.lines_changed + stmt.excluded.lines_changed,
+        'first_seen': func.min(table.c.first_seen, stmt.excluded.first_seen),
+        'last_seen': func.max(table.c.last_seen, stmt.excluded.last_seen)})
+    session.execute(stmt, list(contributions.values()))
+
+
+def insert_contributions(session, file_ids=None):
+    """
+    Insert the contribution index rows computed from the stored commits, of the given files or of every file.
+    """
+    contributions = select(Commits.developer_id, CommitsFiles.file_id, func.count(),
+                           func.sum(Commits.new_lines + Commits.removed_lines), func.min(Commits.timestamp),
+                           func.max(Commits.timestamp))\
+        .join(CommitsFiles, CommitsFiles.commit_id == Commits.id).where(Commits.developer_id.isnot(None))\
+        .group_by(Commits.developer_id, CommitsFiles.file_id)
+    if file_ids is not None:
+        contributions = contributions.where(CommitsFiles.file_id.in_(file_ids))
+    session.execute(DeveloperFiles.__table__.insert().from_select(
+        ['developer_id', 'file_id', 'touches', 'lines_changed', 'first_seen', 'last_seen'], contributions))
+
+
+def rebuild_contributions(session):
+    """
+    Rebuild the developer-file contribution index from the stored commits.
+    """
+    session.query(DeveloperFiles).delete()
+    insert_contributions(session)
+    session.commit()
+
+
+def rebuild_file_contributions(session, file_ids):
+    """
+    Rebuild the contribution index rows of some files from the stored commits, e.g. after merging file rows, in the
+    current transaction.
+    """
+    session.query(DeveloperFiles).filter(DeveloperFiles.file_id.in_(file_ids)).delete(synchronize_session=False)
+    insert_contributions(session, file_ids)
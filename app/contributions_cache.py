@@ -0,0 +1,88 @@
+from models import ContributionsCache
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from utils import user_contributions
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import configparser
+import threading
+
+# Configuration read
+config = configparser.ConfigParser()
+config.read('config.ini')
+CONTRIBUTIONS_TTL = config.getint('Cache', 'Contributions_TTL', fallback=86400)
+UNKNOWN_USER_TTL = config.getint('Cache', 'Unknown_User_TTL', fallback=3600)
+MAX_ENTRIES = config.getint('Cache', 'Contributions_Max_Entries', fallback=10000)
+
+# Stale entries are refreshed in background, at most once at a time per user
+refresh_pool = ThreadPoolExecutor(max_workers=2)
+refreshing = set()
+refreshing_lock = threading.Lock()
+
+
+def fetch_contributions(bind, username):
+    """
+    Look up the contributions of a user in the GitHub commit search and store them in the cache.
+
+    Lookup errors are raised and nothing is stored.
+    """
+    contributions = user_contributions(username)
+    with Session(bind=bind) as session:
+        is_new = session.get(ContributionsCache, username) is None
+        session.merge(ContributionsCache(username=username, contributions=contributions, fetched_at=datetime.utcnow()))
+        session.flush()
+        if is_new and session.query(ContributionsCache).count() > MAX_ENTRIES:
+            evicted = select(ContributionsCache.username).order_by(ContributionsCache.fetched_at.desc())\
+                .offset(MAX_ENTRIES)
+            session.query(ContributionsCache).filter(ContributionsCache.username.in_(evicted))\
+                .delete(synchronize_session=False)
+        session.commit()
+    return contributions
+
+
+def background_refresh(bind, username):
+    try:
+        fetch_contributions(bind, username)
+    except Exception as e:
+        # The stale value keeps being served, the next lookup tries again
+        print('Could not refresh the contributions of %s: %s' % (username, e))
+    finally:
+        with refreshing_lock:
+            refreshing.discard(username)
+
+
+def get_contributions(session, username):
+    """
+    Get the contributions of a user, only blocking on the GitHub search API for users never seen before.
+
+    Expired entries are served as they are while they are refreshed in background (stale-while-revalidate).
+    Users without contributions, including unknown users, are cached as well with a shorter TTL. When the lookup of a
+    new user fails (e.g. rate limited), 0 is returned without caching it.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.Session
+        DB session used to read the cache, writes use their own session on the same engine
+    username : string
+        GitHub username
+
+    Returns
+    -------
+    int
+        Number of commits authored by the user
+    """
+    entry = session.get(ContributionsCache, username)
+    if entry is None:
+        try:
+            return fetch_contributions(session.get_bind(), username)
+        except Exception as e:
+            print('Could not get the contributions of %s: %s' % (username, e))
+            return 0
+    ttl = CONTRIBUTIONS_TTL if entry.contributions else UNKNOWN_USER_TTL
+    if (datetime.utcnow() - entry.fetched_at).total_seconds() > ttl:
+        with refreshing_lock:
+            if username not in refreshing:
+                refreshing.add(username)
+                refresh_pool.submit(background_refresh, session.get_bind(), username)
+    return entry.contributions
@@ -0,0 +1,63 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+import configparser
+
+# Configuration read
+config = configparser.ConfigParser()
+config.read('config.ini')
+DB_NAME = config.get('Database', 'DB_Name', fallback='')
+DB_URL = config.get('Database', 'Url', fallback='') or 'sqlite:///' + DB_NAME
+BUSY_TIMEOUT = config.getint('Database', 'Busy_Timeout', fallback=30000)  # milliseconds
+SYNCHRONOUS = config.get('Database', 'Synchronous', fallback='NORMAL')
+MMAP_SIZE = config.getint('Database', 'Mmap_Size', fallback=268435456)  # bytes
+CACHE_SIZE = config.getint('Database', 'Cache_Size', fallback=-65536)  # pages, or KiB when negative
+POOL_SIZE = config.getint('Database', 'Pool_Size', fallback=5)
+MAX_OVERFLOW = config.getint('Database', 'Max_Overflow', fallback=10)
+
+# Engines are shared by every module of the process
+engines = {}
+
+
+def set_sqlite_pragmas(engine, read_only):
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL lets the readers (webhook) go on while a single writer (backfill) commits
+        if not read_only:
+            cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=%s' % SYNCHRONOUS)
+        cursor.execute('PRAGMA busy_timeout=%d' % BUSY_TIMEOUT)
+        cursor.execute('PRAGMA mmap_size=%d' % MMAP_SIZE)
+        cursor.execute('PRAGMA cache_size=%d' % CACHE_SIZE)
+        if read_only:
+            cursor.execute('PRAGMA query_only=ON')
+        cursor.close()
+
+
+def get_engine(url=None, read_only=False):
+    """
+    Get the shared engine of a database, created on first use with the tuned settings.
+
+    Parameters
+    ----------
+    url : string
+        SQLAlchemy URL of a SQLite database, Database.Url (or the sqlite DB_Name) from config.ini by default. Other
+        databases are not supported, the writes use SQLite upserts and scalar min/max
+    read_only : bool
+        Use a separate pool of connections, that reject writes on SQLite
+
+    Returns
+    -------
+    sqlalchemy.engine.Engine
+        Engine of the database
+    """
+    url = url or DB_URL
+    if not url.startswith('sqlite'):
+        raise ValueError('Only SQLite databases are supported: %s' % url)
+    if (url, read_only) not in engines:
+        engine = create_engine(url, poolclass=QueuePool, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW,
+                               connect_args={'timeout': BUSY_TIMEOUT / 1000, 'check_same_thread': False})
+        set_sqlite_pragmas(engine, read_only)
+        engines[(url, read_only)] = engine
+    return engines[(url, read_only)]
@@ -0,0 +1,90 @@
+from baselines import baseline_cache
+from contributions_cache import get_contributions
+from models import Developer, DailyActivity, DeveloperActivity, DeveloperFiles, File, Pull, DeveloperStats, RepoStats
+from sqlalchemy import case, func
+from stats_engine import REPO_STATS_ID
+
+import datetime
+
+
+class RepoProfile:
+    """
+    Snapshot of the repository wide values used by the rules, loaded once per push and shared by every developer.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.repo_stats = session.get(RepoStats, REPO_STATS_ID)
+        self.number_files = session.query(func.count(File.id)).scalar()
+        # Maintained counters (see activity_rollup) instead of counting the commits
+        self.total_commits = (self.repo_stats.commit_count or 0) if self.repo_stats else 0
+        self.baselines = baseline_cache.get(session)
+        self.day_totals = {}
+
+    def commits_on(self, day):
+        """
+        Get the number of commits of every developer in a day (an ISO date string), None when there are none.
+        """
+        if day not in self.day_totals:
+            activity = self.session.get(DailyActivity, datetime.date.fromisoformat(day))
+            self.day_totals[day] = activity.commits if activity else None
+        return self.day_totals[day]
+
+
+class DeveloperProfile:
+    """
+    Snapshot of everything the rules need about a developer, loaded in a fixed number of queries and shared by every
+    rule evaluated for a push.
+    """
+
+    def __init__(self, session, username, repo=None, needs=None):
+        """
+        Parameters
+        ----------
+        needs : set
+            Data to load (see rule_engine.PROFILE_NEEDS), everything by default; what is not loaded stays empty
+        """
+        self.session = session
+        self.username = username
+        self.repo = repo if repo is not None else RepoProfile(session)
+        self.repo_stats = self.repo.repo_stats
+        self.number_files = self.repo.number_files
+        self.total_commits = self.repo.total_commits
+        self.developer = session.query(Developer).filter_by(username=username).one_or_none()
+        self.first_commit = self.developer is None
+        dev_id = self.developer.id if self.developer else None
+        self.dev_id = dev_id
+        loads = (lambda data: True) if needs is None else needs.__contains__
+        self.contributions = get_contributions(session, username) if loads('contributions') else 0
+        self.stats = session.get(DeveloperStats, dev_id) if dev_id and loads('stats') else None
+        self.owned_files = set()
+        if loads('owned_files'):
+            self.owned_files = {filename for filename, in
+                                session.query(File.filename).filter(File.developer_id == dev_id)}
+        self.file_contributions = {}
+        if loads('file_contributions'):
+            # Lines changed by the developer's commits touching each file, from the contribution index
+            self.file_contributions = dict(
+                session.query(File.filename, func.sum(DeveloperFiles.lines_changed))
+                .select_from(DeveloperFiles).join(File, File.id == DeveloperFiles.file_id)
+                .filter(DeveloperFiles.developer_id == dev_id)
+                .group_by(File.filename))
+        self.touched_files = set(self.file_contributions)
+        self.commit_count = (self.stats.commit_count or 0) if self.stats else 0
+        self.pulls, self.rejected_pulls = 0, 0
+        if loads('pulls'):
+            self.pulls, self.rejected_pulls = session.query(
+                func.count(Pull.id),
+                func.coalesce(func.sum(case(((Pull.state == 'closed') & (Pull.merged == False), 1), else_=0)), 0))\
+                .filter(Pull.developer_id == dev_id).one()
+        self.day_commits = {}
+
+    def commits_on(self, day):
+        """
+        Get the commits of the developer and of everyone in a day, the developer's are None without commits that day.
+        """
+        if day not in self.day_commits:
+            activity = self.session.get(DeveloperActivity, (self.dev_id, datetime.date.fromisoformat(day))) \
+                if self.dev_id else None
+            self.day_commits[day] = activity.commits if activity else None
+        return self.day_commits[day], self.repo.commits_on(day)
@@ -0,0 +1,54 @@
+import re
+
+# Changed lines of a patch, the line length includes the leading '+' or '-'
+CHANGED_LINE = re.compile(r'^[+-].*', re.M)
+FILE_STATUSES = ('added', 'modified', 'removed', 'renamed')
+
+
+def commit_diff_stats(files, line_lengths=False):
+    """
+    Get the diff statistics of the files changed by a commit, scanning each patch once.
+
+    Parameters
+    ----------
+    files : list
+        Files of a commit detail payload (filename, status and, when available, patch)
+    line_lengths : bool
+        Also collect the length of every changed line
+
+    Returns
+    -------
+    dict
+        changed_chars (total length of the changed lines), changed_line_lengths (list, only with line_lengths),
+        additions and deletions (changed lines in the patches), extensions (files per extension) and the number of
+        added, modified, removed and renamed files
+    """
+    stats = {'changed_chars': 0, 'changed_line_lengths': [] if line_lengths else None, 'additions': 0,
+             'deletions': 0, 'extensions': {}}
+    for status in FILE_STATUSES:
+        stats[status] = 0
+    lengths = stats['changed_line_lengths']
+    for file_data in files:
+        filename = file_data['filename']
+        extension = filename[filename.rfind('.') + 1:]
+        stats['extensions'][extension] = stats['extensions'].get(extension, 0) + 1
+        if file_data['status'] in FILE_STATUSES:
+            stats[file_data['status']] += 1
+        patch = file_data.get('patch')
+        if not patch:
+            continue
+        changed_chars = 0
+        additions = 0
+        lines = 0
+        for match in CHANGED_LINE.finditer(patch):
+            length = match.end() - match.start()
+            changed_chars += length
+            lines += 1
+            if patch[match.start()] == '+':
+                additions += 1
+            if lengths is not None:
+                lengths.append(length)
+        stats['changed_chars'] += changed_chars
+        stats['additions'] += additions
+        stats['deletions'] += lines - additions
+    return stats
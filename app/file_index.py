@@ -0,0 +1,188 @@
+from models import Commits, CommitsFiles, File, FileRename
+from sqlalchemy import or_, select
+
+
+class FileIndex:
+    """
+    In-memory index of the file rows by filename, used while ingesting commits.
+
+    The index is loaded once and updated as commits are processed, so resolving a file does not need any query.
+    Rows are plain dicts with the File columns; new rows have no id until the writer stores them and, together with the
+    changed existing rows, the new renames and the merged rows, are handed to the writer by `drain`.
+    Every rename is indexed by previous filename with the time of the renaming commit: a commit touching a filename
+    before it was renamed away is linked to the renamed file, while a commit after the rename is linked to the file
+    currently known by that filename, e.g. a new file reusing the path.
+    A rename can show that two rows are the same file, e.g. a.py renamed to b.py in 2020 by one developer and b.py
+    renamed to c.py in 2021 by another one, ingested in that order: the row known by b.py is then merged into the row of
+    c.py, unless a commit touched it after the rename (a new file reusing the path). So the rows do not depend on the
+    order the commits are ingested in, e.g. one developer at a time.
+    """
+
+    def __init__(self, session, filenames=None):
+        self.session = session
+        self.files = {}
+        self.renamed = {}
+        # Renames (previous filename, time) and newest commit time of each file row, by id() of the row
+        self.renames = {}
+        self.last_seen = {}
+        self.new = []
+        self.changed = {}
+        self.new_renames = []
+        self.merges = []
+        query = session.query(File.id, File.filename, File.previous_filename, File.renamed_at, File.developer_id)
+        renames = session.query(FileRename.file_id, FileRename.previous_filename, FileRename.renamed_at)
+        # Only the files known by the given filenames are loaded, e.g. for a single commit
+        if filenames is not None:
+            known = or_(File.filename.in_(filenames), File.id.in_(
+                select(FileRename.file_id).where(FileRename.previous_filename.in_(filenames))))
+            query = query.filter(known)
+            renames = renames.join(File, File.id == FileRename.file_id).filter(known)
+        files = {}
+        for file_id, filename, previous_filename, renamed_at, developer_id in query.order_by(File.id):
+            file = {'id': file_id, 'filename': filename, 'previous_filename': previous_filename,
+                    'renamed_at': renamed_at, 'developer_id': developer_id}
+            self.files[filename] = file
+            files[file_id] = file
+        for file_id, previous_filename, renamed_at in renames.order_by(FileRename.id):
+            self.add_rename(files[file_id], previous_filename, renamed_at)
+
+    def resolve(self, filename, timestamp=None):
+        """
+        Get the file row known by a filename at the time of a commit, or None if the filename was never seen.
+
+        Parameters
+        ----------
+        filename : string
+            Filename in the commit
+        timestamp : datetime.datetime
+            Time of the commit, without it renames are only used when no file currently has the filename
+        """
+        renames = self.renamed.get(filename, [])
+        if timestamp is not None:
+            # Renamed away after the commit, by the earliest rename if the filename was renamed more than once
+            later = [(renamed_at, file) for renamed_at, file in renames
+                     if renamed_at is not None and renamed_at >= timestamp]
+            if later:
+                return min(later, key=lambda rename: rename[0])[1]
+        file = self.files.get(filename)
+        if file is None:
+            # Renames of unknown time (stored before renamed_at existed) are only used when no file has the filename
+            untimed = [file for renamed_at, file in renames if timestamp is None or renamed_at is None]
+            file = untimed[-1] if untimed else None
+        return file
+
+    def create(self, filename):
+        file = {'id': None, 'filename': filename, 'previous_filename': None, 'renamed_at': None, 'developer_id': None}
+        self.files[filename] = file
+        self.new.append(file)
+        return file
+
+    def update(self, file, **values):
+        file.update(values)
+        # Rows not stored yet are written with their latest values
+        if file['id'] is not None:
+            self.changed[file['id']] = file
+
+    def seen(self, file, timestamp):
+        """
+        Record that a commit at timestamp touched a file.
+        """
+        if self.last_seen.get(id(file), timestamp) <= timestamp:
+            self.last_seen[id(file)] = timestamp
+
+    def add_rename(self, file, previous_filename, renamed_at):
+        self.renamed.setdefault(previous_filename, []).append((renamed_at, file))
+        self.renames.setdefault(id(file), []).append((previous_filename, renamed_at))
+
+    def rename(self, file, previous_filename, filename, timestamp):
+        """
+        Record that a file was previously known by another filename, until the commit renaming it at timestamp.
+
+        The File row keeps its earliest rename, as commits are mostly ingested newest first, while every rename is
+        stored in file_rename.
+
+        Returns
+        -------
+        dict
+            File row of the renamed file, another row when the file was merged into it
+        """
+        other = self.files.get(previous_filename)
+        if other is not None and other is not file and not self.touched_after(other, timestamp):
+            file = self.merge(file, other)
+        if (previous_filename, timestamp) in self.renames.get(id(file), []):
+            return file
+        if file['renamed_at'] is None or timestamp <= file['renamed_at']:
+            self.update(file, previous_filename=previous_filename, renamed_at=timestamp)
+        self.add_rename(file, previous_filename, timestamp)
+        self.new_renames.append({'file': file, 'previous_filename': previous_filename, 'filename': filename,
+                                 'renamed_at': timestamp})
+        return file
+
+    def touched_after(self, file, timestamp):
+        """
+        Check if a commit after timestamp touched a file, in this index or in the stored commits.
+        """
+        if self.last_seen.get(id(file), timestamp) > timestamp:
+            return True
+        if file['id'] is None:
+            return False
+        with self.session.no_autoflush:
+            return self.session.query(Commits.id).join(CommitsFiles, CommitsFiles.commit_id == Commits.id)\
+                .filter(CommitsFiles.file_id == file['id'], Commits.timestamp > timestamp).first() is not None
+
+    def merge(self, file, other):
+        """
+        Merge the row of a file known by an earlier filename into the row of the file, keeping the stored row if only
+        one of them is stored.
+
+        Returns
+        -------
+        dict
+            Merged file row
+        """
+        kept, merged = (other, file) if file['id'] is None and other['id'] is not None else (file, other)
+        filename = file['filename']
+        if self.files.get(other['filename']) is other:
+            del self.files[other['filename']]
+        if self.files.get(filename) is merged:
+            self.files[filename] = kept
+        # The File row keeps the earliest rename of both
+        renames = [row for row in (file, other) if row['renamed_at'] is not None]
+        first = min(renames, key=lambda row: row['renamed_at']) if renames else kept
+        self.update(kept, filename=filename, previous_filename=first['previous_filename'],
+                    renamed_at=first['renamed_at'], developer_id=kept['developer_id'] or merged['developer_id'])
+        for previous_filename, renamed_at in self.renames.pop(id(merged), []):
+            self.renamed[previous_filename] = [(time, kept if row is merged else row)
+                                               for time, row in self.renamed[previous_filename]]
+            self.renames.setdefault(id(kept), []).append((previous_filename, renamed_at))
+        if id(merged) in self.last_seen:
+            self.seen(kept, self.last_seen.pop(id(merged)))
+        # Rows already handed to the writer (e.g. in the associations of buffered commits) are followed to the kept row
+        merged['merged_into'] = kept
+        if merged['id'] is None:
+            self.new.remove(merged)
+        else:
+            self.changed.pop(merged['id'], None)
+            self.merges.append((merged['id'], kept))
+        return kept
+
+    @staticmethod
+    def target(file):
+        """
+        Get the row a file row was merged into, the row itself if it was not merged.
+        """
+        while 'merged_into' in file:
+            file = file['merged_into']
+        return file
+
+    def drain(self):
+        """
+        Get the rows created, the rows changed, the renames and the merged stored rows (id and kept row) since the last
+        call.
+        """
+        drained = self.new, list(self.changed.values()), self.new_renames, self.merges
+        self.new = []
+        self.changed = {}
+        self.new_renames = []
+        self.merges = []
+        return drained
@@ -0,0 +1,209 @@
+from bulk_writer import BulkWriter
+from file_index import FileIndex
+from models import Developer
+from utils import API_URL, api_get, save_commit
+
+from datetime import datetime, timezone
+import subprocess
+import re
+
+# Separators used in the log format to split each commit header from its raw and patch output
+COMMIT_START = '\x1e'
+FIELD_SEP = '\x1f'
+HEADER_END = '\x1d'
+LOG_FORMAT = '--format=%x1e%H%x1f%an%x1f%ae%x1f%at%x1f%B%x1d'
+# git raw status letters to the file status names used by the GitHub API
+FILE_STATUS = {'A': 'added', 'M': 'modified', 'D': 'removed', 'R': 'renamed', 'C': 'copied', 'T': 'changed'}
+NOREPLY_EMAIL = re.compile(r'^(?:\d+\+)?([^@]+)@users\.noreply\.github\.com$')
+MAILMAP_LINE = re.compile(r'^(\S+)\s+<([^>]+)>$')
+
+
+def build_commit_data(header, files, patches):
+    """
+    Build a commit detail payload shaped like the one returned by the GitHub commits endpoint.
+
+    Parameters
+    ----------
+    header : string
+        Commit header fields (SHA, author name, author email, author timestamp, message)
+    files : list
+        Raw diff entries of the commit as (status letter, previous path, path)
+    patches : list
+        Hunk lines of each file, in the same order as the raw entries
+
+    Returns
+    -------
+    dict
+        Commit detail payload with commit, stats and files
+    """
+    sha, name, email, timestamp, message = header.split(FIELD_SEP, 4)
+    date = datetime.fromtimestamp(int(timestamp), timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    additions = 0
+    deletions = 0
+    files_data = []
+    for (status, previous_filename, filename), patch in zip(files, patches + [[]] * (len(files) - len(patches))):
+        file_additions = sum(1 for line in patch if line[:1] == '+')
+        file_deletions = sum(1 for line in patch if line[:1] == '-')
+        additions += file_additions
+        deletions += file_deletions
+        file_data = {'filename': filename, 'status': FILE_STATUS.get(status, 'modified'), 'additions': file_additions,
+                     'deletions': file_deletions, 'changes': file_additions + file_deletions}
+        if status in ('R', 'C'):
+            file_data['previous_filename'] = previous_filename
+        if patch:
+            file_data['patch'] = '\n'.join(patch)
+        files_data.append(file_data)
+    return {'sha': sha,
+            'commit': {'author': {'name': name, 'email': email, 'date': date}, 'message': message.rstrip('\n')},
+            'stats': {'additions': additions, 'deletions': deletions, 'total': additions + deletions},
+            'files': files_data}
+
+
+def iter_commits(repo_path, rev='HEAD'):
+    """
+    Stream the non-merge commits of a (bare) clone as GitHub-shaped commit detail payloads, newest first.
+
+    The commit header, the raw diff (status and renames) and the patch come from a single streamed
+    `git log --raw -p -M`, the line counts are taken from the patch hunks.
+    """
+    proc = subprocess.Popen(['git', '--git-dir', repo_path, '-c', 'core.quotePath=false', 'log', '--no-merges', '-M',
+                             '--raw', '-p', '--no-color', '--no-ext-diff', LOG_FORMAT, rev],
+                            stdout=subprocess.PIPE, encoding='utf-8', errors='replace')
+    header = None
+    files = []
+    patches = []
+    in_hunk = False
+    for line in proc.stdout:
+        line = line.rstrip('\n')
+        if line.startswith(COMMIT_START):
+            if header is not None and HEADER_END in header:
+                yield build_commit_data(header[:header.index(HEADER_END)], files, patches)
+            header = line[1:] + '\n'
+            files = []
+            patches = []
+            in_hunk = False
+        elif header is not None and HEADER_END not in header:
+            header += line + '\n'
+        elif line.startswith(':'):
+            meta, paths = line.split('\t', 1)
+            status = meta.split()[4][0]
+            paths = paths.split('\t')
+            files.append((status, paths[0], paths[-1]))
+        elif line.startswith('diff --git '):
+            patches.append([])
+            in_hunk = False
+        elif line.startswith('@@') and patches:
+            in_hunk = True
+            patches[-1].append(line)
+        elif in_hunk and line[:1] in ('+', '-', ' ', '\\'):
+            patches[-1].append(line)
+    if header is not None and HEADER_END in header:
+        yield build_commit_data(header[:header.index(HEADER_END)], files, patches)
+    proc.stdout.close()
+    if proc.wait() != 0:
+        raise subprocess.CalledProcessError(proc.returncode, 'git log')
+
+
+def read_mailmap(path):
+    """
+    Read a file mapping author emails to GitHub logins, one `login <email>` per line, `#` starting a comment.
+
+    Returns
+    -------
+    dict
+        Login of each (lower case) email
+    """
+    mailmap = {}
+    with open(path, encoding='utf-8') as mailmap_file:
+        for number, line in enumerate(mailmap_file, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            match = MAILMAP_LINE.match(line)
+            if match is None:
+                raise ValueError('%s:%s: expected "login <email>", got %r' % (path, number, line))
+            mailmap[match.group(2).lower()] = match.group(1)
+    return mailmap
+
+
+def commit_author_login(owner, repo, sha):
+    """
+    Get the GitHub login of the author of a commit, None when GitHub does not link the commit to a user.
+    """
+    data = api_get(API_URL + 'repos/{}/{}/commits/{}'.format(owner, repo, sha))
+    # Error responses (e.g. a commit GitHub does not know) have no author either
+    author = data.get('author')
+    return author['login'] if author else None
+
+
+def author_login(logins, commit_data, lookup=None):
+    """
+    Get the GitHub login of a commit author, mapping each distinct author email once.
+
+    An email is mapped by the mailmap (prefilled in logins), a GitHub no-reply address or, when given, a single
+    lookup of the commit.
+
+    Parameters
+    ----------
+    logins : dict
+        Login (None if unknown) of each lower case email mapped so far, updated
+    commit_data : dict
+        Commit detail payload
+    lookup : callable
+        Function giving the login of the author of a commit SHA, e.g. commit_author_login for the repository
+    """
+    email = commit_data['commit']['author']['email'].lower()
+    if email not in logins:
+        match = NOREPLY_EMAIL.match(email)
+        if match:
+            logins[email] = match.group(1)
+        else:
+            logins[email] = lookup(commit_data['sha']) if lookup else None
+    return logins[email]
+
+
+def ingest_clone(repo_path, db_session, rev='HEAD', batch_size=100, mailmap=None, lookup=None):
+    """
+    Populate Commits, File and CommitsFiles from a local clone instead of the REST API.
+
+    Each distinct author email is mapped to a GitHub login (see author_login). Commits whose login is not a known
+    developer are skipped, as the API path does for unknown authors, and counted. Merge commits are not ingested.
+    Disjoint revision ranges (e.g. `v1.0..v2.0`) can be ingested by separate processes into separate databases.
+
+    Parameters
+    ----------
+    repo_path : string
+        Path to the (bare) clone
+    db_session : sqlalchemy.orm.Session
+        DB session used in ORM related operations
+    rev : string
+        Revision or revision range to walk
+    batch_size : int
+        Number of buffered commits per transaction
+    mailmap : dict
+        Login of author emails (lower case), e.g. from read_mailmap
+    lookup : callable
+        Function giving the login of the author of a commit SHA, called once per email not mapped otherwise
+
+    Returns
+    -------
+    tuple
+        Number of stored commits, number of skipped commits and the (lower case) emails of their authors
+    """
+    developers = {dev.username.lower(): dev for dev in db_session.query(Developer).all()}
+    logins = dict(mailmap or {})
+    writer = BulkWriter(db_session, FileIndex(db_session), batch_size)
+    stored = 0
+    skipped = 0
+    unknown = set()
+    for commit_data in iter_commits(repo_path, rev):
+        login = author_login(logins, commit_data, lookup)
+        dev = developers.get(login.lower()) if login else None
+        if dev is None:
+            skipped += 1
+            unknown.add(commit_data['commit']['author']['email'].lower())
+            continue
+        if save_commit(commit_data, dev, writer):
+            stored += 1
+    writer.flush()
+    return stored, skipped, unknown
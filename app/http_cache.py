@@ -0,0 +1,68 @@
+import threading
+import sqlite3
+import json
+import re
+
+# Commit detail URLs addressed by a full SHA never change once created
+IMMUTABLE_URL = re.compile(r'/commits/[0-9a-f]{40}$')
+
+
+class HttpCache:
+    """
+    On-disk cache of GitHub API responses keyed by URL.
+
+    Responses of immutable resources are served straight from disk, everything else is revalidated with a
+    conditional request (ETag / Last-Modified) so unchanged resources cost a 304 that does not count against the
+    rate limit.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._con:
+            self._con.execute('CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, etag TEXT, '
+                              'last_modified TEXT, body TEXT, immutable INTEGER)')
+
+    def lookup(self, url):
+        with self._lock:
+            return self._con.execute('SELECT etag, last_modified, body, immutable FROM responses WHERE url = ?',
+                                     (url,)).fetchone()
+
+    def store(self, url, etag, last_modified, body, immutable):
+        with self._lock, self._con:
+            self._con.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                              (url, etag, last_modified, body, int(immutable)))
+
+    def get(self, req_session, url):
+        """
+        Get the JSON body of an API resource, using the cache whenever possible.
+
+        Parameters
+        ----------
+        req_session : requests.Session
+            Authenticated session used when the resource has to be (re)validated
+        url : string
+            Resource URL
+
+        Returns
+        -------
+        dict or list
+            Decoded JSON body
+        """
+        cached = self.lookup(url)
+        if cached and cached[3]:
+            return json.loads(cached[2])
+        headers = {}
+        if cached:
+            if cached[0]:
+                headers['If-None-Match'] = cached[0]
+            if cached[1]:
+                headers['If-Modified-Since'] = cached[1]
+        r = req_session.get(url, headers=headers)
+        if r.status_code == 304 and cached:
+            return json.loads(cached[2])
+        etag = r.headers.get('ETag')
+        last_modified = r.headers.get('Last-Modified')
+        if r.status_code == 200 and (etag or last_modified or IMMUTABLE_URL.search(url)):
+            self.store(url, etag, last_modified, r.text, IMMUTABLE_URL.search(url) is not None)
+        return r.json()
@@ -0,0 +1,115 @@
+from models import Job
+
+from datetime import datetime
+import threading
+import queue
+import json
+
+
+class JobQueue:
+    """
+    Queue of webhook jobs processed by a pool of worker threads.
+
+    Jobs are persisted in the job table, so their status can be queried and the jobs still queued or running when the
+    process stopped are processed again on start.
+    """
+
+    def __init__(self, session_factory, handler, workers, read_session_factory=None):
+        """
+        Parameters
+        ----------
+        session_factory : sqlalchemy.orm.sessionmaker
+            Factory of the sessions used by the queue and given to the handler
+        handler : function
+            Called as handler(session, payload) by a worker, returns the JSON serializable job result
+        workers : int
+            Number of worker threads
+        read_session_factory : sqlalchemy.orm.sessionmaker
+            Factory of the sessions used for the status queries, session_factory by default
+        """
+        self.session_factory = session_factory
+        self.read_session_factory = read_session_factory or session_factory
+        self.handler = handler
+        self.workers = workers
+        self.queue = queue.Queue()
+        self.started = False
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.wait_time = 0.0
+        self.processing_time = 0.0
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        with self.session_factory() as session:
+            for job_id, in session.query(Job.id).filter(Job.status.in_(('queued', 'running'))).order_by(Job.id):
+                self.queue.put(job_id)
+        for _ in range(self.workers):
+            threading.Thread(target=self.work, daemon=True).start()
+
+    def submit(self, payload):
+        """
+        Store and enqueue a job, returning its id.
+        """
+        self.start()
+        with self.session_factory() as session:
+            job = Job(status='queued', payload=json.dumps(payload), created_at=datetime.utcnow())
+            session.add(job)
+            session.commit()
+            job_id = job.id
+        self.queue.put(job_id)
+        return job_id
+
+    def work(self):
+        while True:
+            job_id = self.queue.get()
+            try:
+                self.process(job_id)
+            finally:
+                self.queue.task_done()
+
+    def process(self, job_id):
+        with self.session_factory() as session:
+            job = session.get(Job, job_id)
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            session.commit()
+            try:
+                job.result = json.dumps(self.handler(session, json.loads(job.payload)))
+                job.status = 'done'
+            except Exception as e:
+                session.rollback()
+                job.status = 'failed'
+                job.error = repr(e)
+            job.finished_at = datetime.utcnow()
+            session.commit()
+            with self.lock:
+                self.processed += 1
+                self.failed += 1 if job.status == 'failed' else 0
+                self.wait_time += (job.started_at - job.created_at).total_seconds()
+                self.processing_time += (job.finished_at - job.started_at).total_seconds()
+
+    def status(self, job_id):
+        """
+        Get the status of a job as a dict, or None if there is no such job.
+        """
+        with self.read_session_factory() as session:
+            job = session.get(Job, job_id)
+            if job is None:
+                return None
+            return {'id': job.id, 'status': job.status, 'result': json.loads(job.result) if job.result else None,
+                    'error': job.error, 'created_at': str(job.created_at), 'started_at': str(job.started_at),
+                    'finished_at': str(job.finished_at)}
+
+    def stats(self):
+        """
+        Get the queue depth and the mean waiting and processing times (seconds) of the jobs processed since start.
+        """
+        with self.lock:
+            return {'queued': self.queue.qsize(), 'workers': self.workers, 'processed': self.processed,
+                    'failed': self.failed,
+                    'mean_wait_time': self.wait_time / self.processed if self.processed else 0.0,
+                    'mean_processing_time': self.processing_time / self.processed if self.processed else 0.0}
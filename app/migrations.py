@@ -0,0 +1,147 @@
+from activity_rollup import rebuild_activity
+from contribution_index import rebuild_contributions
+from models import Base, Commits, CommitsFiles, DailyActivity, DeveloperActivity, DeveloperFiles, DeveloperStats, \
+    File, FileRename, RepoStats, create_tables
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from stats_engine import calculate_stats
+
+# Hot queries of the ingestion and the webhook rules, each must be answered through an index
+HOT_QUERIES = {
+    'developer by username': 'SELECT id FROM developer WHERE username = :value',
+    'commit by sha': 'SELECT id FROM commits WHERE sha = :value',
+    'newest commit of a developer':
+        'SELECT timestamp, sha FROM commits WHERE developer_id = :value ORDER BY timestamp DESC LIMIT 1',
+    'commits of a day': 'SELECT id FROM commits WHERE day = :value',
+    'file by filename': 'SELECT id FROM file WHERE filename IN (:value)',
+    'renames of a filename': 'SELECT file_id FROM file_rename WHERE previous_filename IN (:value)',
+    'files owned by a developer': 'SELECT filename FROM file WHERE developer_id = :value',
+    'daily stats of a developer':
+        'SELECT number_commits FROM commits_stats WHERE date = :value AND developer_id = :value',
+    'pulls of a developer': 'SELECT count(id), sum(state = \'closed\' AND NOT merged) FROM pull '
+                            'WHERE developer_id = :value',
+    'verdicts of a user': 'SELECT id FROM verdict WHERE username = :value ORDER BY timestamp DESC LIMIT 100',
+    'pending jobs': 'SELECT id FROM job WHERE status IN (\'queued\', \'running\') ORDER BY id',
+}
+
+
+def add_missing_columns(db_engine):
+    """
+    Add the model columns missing from the existing tables, e.g. commits.sha on a database created before it.
+    """
+    inspector = inspect(db_engine)
+    added = []
+    with db_engine.begin() as con:
+        for table in Base.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    con.execute(text('ALTER TABLE %s ADD COLUMN %s %s' % (
+                        table.name, column.name, column.type.compile(dialect=db_engine.dialect))))
+                    added.append('%s.%s' % (table.name, column.name))
+    return added
+
+
+def add_missing_indexes(db_engine):
+    """
+    Create the model indexes missing from the existing tables.
+
+    A unique index is left out, with a warning, when the stored rows have duplicates.
+    """
+    inspector = inspect(db_engine)
+    added = []
+    for table in Base.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(db_engine)
+                added.append(index.name)
+            except IntegrityError:
+                print('Index %s not created, %s has duplicated values' % (index.name, table.name))
+    return added
+
+
+def backfill_renamed_at(session):
+    """
+    Set the rename time of the renamed files from their earliest commit with a rename, the rename kept in the File row
+    by the ingestion.
+    """
+    renamed_at = select(func.min(Commits.timestamp)).join(CommitsFiles, CommitsFiles.commit_id == Commits.id)\
+        .where(CommitsFiles.file_id == File.id, CommitsFiles.status == 'renamed').scalar_subquery()
+    session.query(File).filter(File.previous_filename.isnot(None), File.previous_filename != '')\
+        .update({File.renamed_at: renamed_at}, synchronize_session=False)
+    session.commit()
+
+
+def backfill_file_renames(session):
+    """
+    Store the rename kept in each File row in file_rename, the only one known for the files renamed before the table
+    existed.
+    """
+    renames = select(File.id, File.previous_filename, File.filename, File.renamed_at)\
+        .where(File.previous_filename.isnot(None), File.previous_filename != '')
+    session.execute(FileRename.__table__.insert().from_select(
+        ['file_id', 'previous_filename', 'filename', 'renamed_at'], renames))
+    session.commit()
+
+
+def upgrade_schema(db_engine):
+    """
+    Bring a database to the current models: create the missing tables, then add the missing columns and indexes.
+
+    Every step only adds what is missing, so it is safe to run on every start. The tables derived from the commits
+    (stats, contribution index and daily activity) are rebuilt when they, or their maintained columns, are added to a
+    database with commits.
+    """
+    existing = set(inspect(db_engine).get_table_names())
+    create_tables(db_engine)
+    added_columns = add_missing_columns(db_engine)
+    for column in added_columns:
+        print('Added column %s' % column)
+    for index in add_missing_indexes(db_engine):
+        print('Added index %s' % index)
+    if Commits.__tablename__ not in existing:
+        return
+    stats = ('%s.commit_count' % DeveloperStats.__tablename__, '%s.commit_count' % RepoStats.__tablename__)
+    if '%s.sha' % Commits.__tablename__ in added_columns:
+        # Matched by the bulk writer, see BulkWriter.backfill_shas
+        print('Stored commits have no SHA yet, the next sync sets it on the commits it lists again')
+    with Session(db_engine) as session:
+        if '%s.renamed_at' % File.__tablename__ in added_columns:
+            print('Filling the rename times of the files')
+            backfill_renamed_at(session)
+        if FileRename.__tablename__ not in existing:
+            print('Filling the file renames')
+            backfill_file_renames(session)
+        if any(column in added_columns for column in stats) or \
+                not existing.issuperset((DeveloperStats.__tablename__, RepoStats.__tablename__)):
+            print('Rebuilding the developer and repository stats')
+            calculate_stats(session)
+        if DeveloperFiles.__tablename__ not in existing:
+            print('Building the developer-file contribution index')
+            rebuild_contributions(session)
+        if not existing.issuperset((DailyActivity.__tablename__, DeveloperActivity.__tablename__)):
+            print('Filling the daily activity counters')
+            rebuild_activity(session)
+
+
+def check_query_plans(db_engine):
+    """
+    Run EXPLAIN QUERY PLAN (SQLite) for the hot queries and report the ones scanning a whole table.
+
+    Returns
+    -------
+    list
+        Query name and plan of every hot query not using an index, empty when they all do
+    """
+    problems = []
+    with db_engine.connect() as con:
+        for name, query in HOT_QUERIES.items():
+            plan = [row[-1] for row in con.execute(text('EXPLAIN QUERY PLAN ' + query), {'value': ''})]
+            # Full scans show as "SCAN <table>", index scans as "SCAN <table> USING [COVERING] INDEX ..."
+            if any(step.startswith('SCAN') and 'USING' not in step for step in plan):
+                problems.append((name, plan))
+    return problems
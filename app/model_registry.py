@@ -0,0 +1,182 @@
+from behaviour_features import all_training_data, dev_training_data, parse_commits, training_fingerprint
+from sklearn.preprocessing import MinMaxScaler
+from sklearn.svm import OneClassSVM
+
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import configparser
+import threading
+import hashlib
+import time
+import joblib
+import glob
+import os
+
+# Configuration read
+config = configparser.ConfigParser()
+config.read('config.ini')
+MODELS_DIR = config.get('Model', 'Directory', fallback='svm_models')
+MAX_MODELS = config.getint('Model', 'Max_Models', fallback=64)
+MIN_SAMPLES = config.getint('Model', 'Min_Samples', fallback=2)
+KERNEL = config.get('Model', 'Kernel', fallback='poly')
+GAMMA = config.get('Model', 'Gamma', fallback='auto')
+NU = config.getfloat('Model', 'Nu', fallback=0.1)
+
+# Scaler and model of a developer, with the key of the data they were trained on
+DeveloperModel = namedtuple('DeveloperModel', ['scaler', 'model', 'data_hash'])
+
+
+def model_params():
+    try:
+        gamma = float(GAMMA)
+    except ValueError:
+        gamma = GAMMA
+    return {'kernel': KERNEL, 'gamma': gamma, 'nu': NU}
+
+
+def data_hash(data, params):
+    """
+    Hash the training data and the model parameters, models are stored under this key.
+    """
+    digest = hashlib.sha1(repr((data.shape, sorted(params.items()))).encode())
+    digest.update(data.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def train_model(data, params):
+    scaler = MinMaxScaler()
+    scaled = scaler.fit_transform(data)
+    model = OneClassSVM(**params)
+    model.fit(scaled)
+    return scaler, model
+
+
+def model_path(directory, developer_id, key):
+    return os.path.join(directory, '%s-%s.joblib' % (developer_id, key))
+
+
+def store_model(directory, developer_id, key, scaler, model):
+    """
+    Write a developer model and remove the ones trained on previous data.
+    """
+    path = model_path(directory, developer_id, key)
+    # Written aside and renamed, so other processes never load a partial file
+    joblib.dump((scaler, model), path + '.tmp')
+    os.replace(path + '.tmp', path)
+    for old_path in glob.glob(model_path(directory, developer_id, '*')):
+        if old_path != path:
+            os.remove(old_path)
+
+
+def fit_and_store(directory, developer_id, key, data, params):
+    """
+    Train and store a developer model, run in the worker processes of train_all.
+
+    Returns
+    -------
+    float
+        Fit time in seconds
+    """
+    start_time = time.perf_counter()
+    scaler, model = train_model(data, params)
+    fit_time = time.perf_counter() - start_time
+    store_model(directory, developer_id, key, scaler, model)
+    return fit_time
+
+
+def train_all(session, directory=MODELS_DIR, params=None, workers=None):
+    """
+    Train the model of every developer with at least MIN_SAMPLES days with commits, in parallel across processes.
+
+    Developers with a stored model trained on the same data and parameters are skipped.
+
+    Returns
+    -------
+    list
+        Per developer report: developer_id, samples, status (trained, skipped or failed), fit_time and error
+    """
+    params = params or model_params()
+    os.makedirs(directory, exist_ok=True)
+    report = []
+    futures = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for developer_id, data in all_training_data(session, MIN_SAMPLES).items():
+            key = data_hash(data, params)
+            entry = {'developer_id': developer_id, 'samples': len(data), 'status': 'skipped', 'fit_time': None,
+                     'error': None}
+            report.append(entry)
+            if not os.path.exists(model_path(directory, developer_id, key)):
+                futures[executor.submit(fit_and_store, directory, developer_id, key, data, params)] = entry
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                entry['fit_time'] = future.result()
+                entry['status'] = 'trained'
+            except Exception as e:
+                entry['status'] = 'failed'
+                entry['error'] = repr(e)
+    return report
+
+
+class ModelRegistry:
+    """
+    Per developer scalers and OneClassSVM models, trained once and persisted with joblib.
+
+    Models are files named <developer id>-<data hash>.joblib, loaded lazily into a bounded LRU. A developer's model is
+    trained again only when the developer's daily stats (CommitsStats) changed since it was loaded, and only if no
+    stored model was trained on the same data.
+    """
+
+    def __init__(self, directory=MODELS_DIR, max_models=MAX_MODELS, params=None):
+        self.directory = directory
+        self.max_models = max_models
+        self.params = params or model_params()
+        self.models = OrderedDict()
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def load_or_train(self, session, developer_id):
+        data = dev_training_data(session, developer_id)
+        if len(data) < MIN_SAMPLES:
+            return None
+        key = data_hash(data, self.params)
+        path = model_path(self.directory, developer_id, key)
+        if os.path.exists(path):
+            scaler, model = joblib.load(path)
+        else:
+            scaler, model = train_model(data, self.params)
+            store_model(self.directory, developer_id, key, scaler, model)
+        return DeveloperModel(scaler, model, key)
+
+    def get(self, session, developer_id):
+        """
+        Get the scaler and model of a developer, None when the developer has too few days with commits.
+        """
+        fingerprint = training_fingerprint(session, developer_id)
+        with self.lock:
+            # Entries are (fingerprint of the daily stats, model), the model is None for too few days
+            cached = self.models.get(developer_id)
+            if cached is not None and cached[0] == fingerprint:
+                self.models.move_to_end(developer_id)
+                return cached[1]
+        entry = self.load_or_train(session, developer_id)
+        with self.lock:
+            self.models[developer_id] = (fingerprint, entry)
+            self.models.move_to_end(developer_id)
+            while len(self.models) > self.max_models:
+                self.models.popitem(last=False)
+        return entry
+
+    def score(self, session, developer_id, commits):
+        """
+        Classify commits from the GitHub API against the developer's behaviour.
+
+        Returns
+        -------
+        int
+            1 when the commits fit the developer behaviour, -1 for an anomaly, None without a model
+        """
+        entry = self.get(session, developer_id) if developer_id is not None else None
+        if entry is None:
+            return None
+        return int(entry.model.predict(entry.scaler.transform(parse_commits(commits)))[0])
@@ -0,0 +1,132 @@
+from behaviour_features import FEATURE_COLUMNS, all_training_data
+from models import SweepResult
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+from sklearn.svm import OneClassSVM
+from sqlalchemy import func
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from itertools import product
+import numpy as np
+import time
+
+SCALERS = {'minmax': MinMaxScaler, 'standard': StandardScaler}
+# Feature subsets by name, as indexes of FEATURE_COLUMNS
+FEATURE_SUBSETS = {
+    'all': tuple(range(len(FEATURE_COLUMNS))),
+    # Changed chars, lines and files
+    'changes': (2, 3, 4, 5, 6, 7, 10, 11, 12, 13, 14, 15),
+    # Means only, without the variances
+    'means': (0, 1, 2, 4, 6, 7, 8, 10, 12, 14),
+}
+# Covers the kernel, gamma and nu combinations previously tested by hand
+DEFAULT_GRID = {
+    'kernel': ['rbf', 'poly', 'sigmoid', 'linear'],
+    'gamma': ['auto', 'scale'],
+    'nu': [0.1, 0.2],
+    'scaler': ['minmax'],
+    'features': ['all'],
+}
+
+
+def split_train_test(data):
+    """
+    Split the days of a developer into the first half, to train, and the second half, to test.
+
+    With 3 days or less, the same days are used to train and to test.
+    """
+    if len(data) <= 3:
+        return data, data
+    index = len(data) // 2
+    return data[:index], data[index:]
+
+
+def sweep_developer(developer_id, data, grid):
+    """
+    Evaluate every combination of the grid for a developer, run in the worker processes of run_sweep.
+
+    Scalers are fitted once per scaler and feature subset, and the scaled splits are reused by every model.
+
+    Returns
+    -------
+    list
+        SweepResult rows (dicts) without sweep_id
+    """
+    train, test = split_train_test(data)
+    rows = []
+    for scaler_name, features in product(grid['scaler'], grid['features']):
+        columns = list(FEATURE_SUBSETS[features])
+        scaler = SCALERS[scaler_name]()
+        scaled_train = scaler.fit_transform(train[:, columns])
+        scaled_test = scaler.transform(test[:, columns])
+        for kernel, gamma, nu in product(grid['kernel'], grid['gamma'], grid['nu']):
+            row = {'developer_id': developer_id, 'kernel': kernel, 'gamma': str(gamma), 'nu': nu,
+                   'scaler': scaler_name, 'features': features, 'train_samples': len(train),
+                   'test_samples': len(test), 'fp_rate': None, 'fit_time': None, 'predict_time': None, 'error': None}
+            try:
+                start_time = time.perf_counter()
+                model = OneClassSVM(kernel=kernel, gamma=gamma, nu=nu)
+                model.fit(scaled_train)
+                row['fit_time'] = time.perf_counter() - start_time
+                start_time = time.perf_counter()
+                predict = model.predict(scaled_test)
+                row['predict_time'] = time.perf_counter() - start_time
+                # Test days are all the developer's own behaviour, so only false positives can be measured
+                row['fp_rate'] = int(np.count_nonzero(predict == -1)) / len(predict) * 100
+            except Exception as e:
+                row['error'] = repr(e)
+            rows.append(row)
+    return rows
+
+
+def run_sweep(session, grid=None, workers=None, min_samples=4):
+    """
+    Evaluate a parameter grid for every developer with at least min_samples days with commits, in parallel across
+    developers, and store the results in the sweep_result table.
+
+    Parameters
+    ----------
+    grid : dict
+        Lists of kernel, gamma, nu, scaler (SCALERS names) and features (FEATURE_SUBSETS names), DEFAULT_GRID by default
+
+    Returns
+    -------
+    int
+        Id of the sweep, to query its results
+    """
+    grid = dict(DEFAULT_GRID, **(grid or {}))
+    sweep_id = (session.query(func.max(SweepResult.sweep_id)).scalar() or 0) + 1
+    created_at = datetime.utcnow()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(sweep_developer, developer_id, data, grid)
+                   for developer_id, data in all_training_data(session, min_samples).items()]
+        for future in as_completed(futures):
+            rows = future.result()
+            for row in rows:
+                row.update(sweep_id=sweep_id, created_at=created_at)
+            if rows:
+                session.execute(SweepResult.__table__.insert(), rows)
+    session.commit()
+    return sweep_id
+
+
+def best_params(session, sweep_id):
+    """
+    Get the best combination of a sweep for each developer.
+
+    Without anomalous days to test on, the lowest FP rate would always pick the most permissive model, which takes
+    any commit as normal. nu bounds the share of training days a OneClassSVM leaves out of its boundary, so the best
+    combination is the one whose FP rate on the unseen test days is closest to nu (a boundary as tight as intended,
+    that generalizes), the fastest to fit among equals.
+
+    Returns
+    -------
+    dict
+        Developer id to its best SweepResult
+    """
+    best = {}
+    for result in session.query(SweepResult).filter(SweepResult.sweep_id == sweep_id, SweepResult.error.is_(None))\
+            .order_by(SweepResult.developer_id, func.abs(SweepResult.fp_rate - SweepResult.nu * 100),
+                      SweepResult.fit_time):
+        best.setdefault(result.developer_id, result)
+    return best
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Date, Boolean, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Date, Boolean, Float, ForeignKey, Index
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -19,7 +19,7 @@ class Developer(Base):
     __tablename__ = 'developer'
 
     id = Column(Integer, primary_key=True)
-    username = Column(String)
+    username = Column(String, unique=True, index=True)
     contributions = Column(Integer)
     account_creation = Column(DateTime)
     follower_number = Column(Integer)
@@ -27,6 +27,7 @@ class Developer(Base):
     commits = relationship('Commits', back_populates='developer')
     commits_stats = relationship('CommitsStats', back_populates='developer')
     global_stats = relationship('DeveloperStats', back_populates='developer')
+    sync_state = relationship('SyncState', back_populates='developer', uselist=False)
     files = relationship('File', back_populates='owner')
     pull = relationship('Pull', back_populates='author')
 
@@ -37,9 +38,11 @@ class Developer(Base):
 
 class Commits(Base):
     __tablename__ = 'commits'
+    __table_args__ = (Index('ix_commits_developer_id_timestamp', 'developer_id', 'timestamp'),)
 
     id = Column(Integer, primary_key=True)
-    day = Column(Date)
+    sha = Column(String, unique=True, index=True)
+    day = Column(Date, index=True)
     timestamp = Column(DateTime)
     languages = Column(String)
     message = Column(String)
@@ -64,9 +67,11 @@ class File(Base):
     __tablename__ = 'file'
 
     id = Column(Integer, primary_key=True)
-    filename = Column(String)
-    previous_filename = Column(String)
-    developer_id = Column(Integer, ForeignKey('developer.id'))  # file author/owner
+    filename = Column(String, index=True)
+    # Earliest rename of the file, every rename is in file_rename
+    previous_filename = Column(String, index=True)
+    renamed_at = Column(DateTime)  # timestamp of the commit renaming the file from previous_filename
+    developer_id = Column(Integer, ForeignKey('developer.id'), index=True)  # file author/owner
 
     commit = relationship('CommitsFiles', back_populates='file')
     owner = relationship('Developer', back_populates='files')
@@ -75,8 +80,25 @@ class File(Base):
         return "Id %s | Filename %s | Previous filename %s" % (self.id, self.filename, self.previous_filename)
 
 
+class FileRename(Base):
+    __tablename__ = 'file_rename'
+    __table_args__ = (Index('ix_file_rename_file_id_previous_filename_renamed_at', 'file_id', 'previous_filename',
+                            'renamed_at', unique=True),)
+
+    id = Column(Integer, primary_key=True)
+    file_id = Column(Integer, ForeignKey('file.id'))
+    previous_filename = Column(String, index=True)
+    filename = Column(String)  # filename given by the rename
+    renamed_at = Column(DateTime)  # timestamp of the renaming commit
+
+    def __repr__(self):
+        return "File %s | %s -> %s | Renamed at %s" % (self.file_id, self.previous_filename, self.filename,
+                                                        self.renamed_at)
+
+
 class CommitsStats(Base):
     __tablename__ = 'commits_stats'
+    __table_args__ = (Index('ix_commits_stats_date_developer_id', 'date', 'developer_id'),)
 
     id = Column(Integer, primary_key=True)
     date = Column(Date)
@@ -112,6 +134,7 @@ class DeveloperStats(Base):
     __tablename__ = 'developer_stats'
 
     developer_id = Column(Integer, ForeignKey('developer.id'), primary_key=True)
+    commit_count = Column(Integer)  # number of commits summarized, with avg and var the stats can be merged
     new_lines_avg = Column(Float)
     new_lines_std = Column(Float)
     new_lines_var = Column(Float)
@@ -135,6 +158,7 @@ class RepoStats(Base):
     __tablename__ = 'repo_stats'
 
     id = Column(Integer, primary_key=True)
+    commit_count = Column(Integer)  # number of commits summarized, with avg and var the stats can be merged
     new_lines_avg = Column(Float)
     new_lines_std = Column(Float)
     new_lines_var = Column(Float)
@@ -154,6 +178,7 @@ class RepoStats(Base):
 
 class Pull(Base):
     __tablename__ = 'pull'
+    __table_args__ = (Index('ix_pull_developer_id_state_merged', 'developer_id', 'state', 'merged'),)
 
     id = Column(Integer, primary_key=True)
     merged = Column(Boolean)
@@ -163,5 +188,102 @@ class Pull(Base):
     author = relationship('Developer', back_populates='pull')
 
 
+class DeveloperFiles(Base):
+    __tablename__ = 'developer_files'
+
+    developer_id = Column(Integer, ForeignKey('developer.id'), primary_key=True)
+    file_id = Column(Integer, ForeignKey('file.id'), primary_key=True)
+    touches = Column(Integer)  # commits of the developer touching the file
+    lines_changed = Column(Integer)  # lines changed by those commits
+    first_seen = Column(DateTime)
+    last_seen = Column(DateTime)
+
+
+class ContributionsCache(Base):
+    __tablename__ = 'contributions_cache'
+
+    username = Column(String, primary_key=True)
+    contributions = Column(Integer)  # commits found by the GitHub commit search, 0 for unknown users
+    fetched_at = Column(DateTime)
+
+
+class Job(Base):
+    __tablename__ = 'job'
+
+    id = Column(Integer, primary_key=True)
+    status = Column(String, index=True)  # queued, running, done or failed
+    payload = Column(String)  # JSON webhook payload
+    result = Column(String)  # JSON result of the processing
+    error = Column(String)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+class Verdict(Base):
+    __tablename__ = 'verdict'
+    __table_args__ = (Index('ix_verdict_username_timestamp', 'username', 'timestamp'),)
+
+    id = Column(Integer, primary_key=True)
+    commit_sha = Column(String)
+    username = Column(String)
+    timestamp = Column(DateTime, index=True)  # commit timestamp
+    created_at = Column(DateTime)
+    violated = Column(Float)  # percentage of violated rules
+    trusted = Column(Boolean)
+    accepted = Column(Boolean)  # added to the developer and repository baselines
+    rules = Column(String)  # JSON outcome of each rule
+    evaluation_time = Column(Float)  # seconds
+
+
+class SyncState(Base):
+    __tablename__ = 'sync_state'
+
+    developer_id = Column(Integer, ForeignKey('developer.id'), primary_key=True)
+    last_commit_timestamp = Column(DateTime)  # high-water mark of the last completed sync
+    last_commit_sha = Column(String)
+    page = Column(Integer)  # next commits page to fetch while a sync is in progress
+    pending_commit_timestamp = Column(DateTime)  # newest commit stored by the sync in progress
+    pending_commit_sha = Column(String)
+
+    developer = relationship('Developer', back_populates='sync_state')
+
+
+class DailyActivity(Base):
+    __tablename__ = 'daily_activity'
+
+    date = Column(Date, primary_key=True)
+    commits = Column(Integer)  # commits of every developer in the day
+
+
+class DeveloperActivity(Base):
+    __tablename__ = 'developer_activity'
+
+    developer_id = Column(Integer, ForeignKey('developer.id'), primary_key=True)
+    date = Column(Date, primary_key=True)
+    commits = Column(Integer)  # commits of the developer in the day
+
+
+class SweepResult(Base):
+    __tablename__ = 'sweep_result'
+    __table_args__ = (Index('ix_sweep_result_sweep_id_developer_id', 'sweep_id', 'developer_id'),)
+
+    id = Column(Integer, primary_key=True)
+    sweep_id = Column(Integer)  # results of the same sweep run
+    created_at = Column(DateTime)
+    developer_id = Column(Integer, ForeignKey('developer.id'))
+    kernel = Column(String)
+    gamma = Column(String)  # auto, scale or a number
+    nu = Column(Float)
+    scaler = Column(String)
+    features = Column(String)  # name of the feature subset
+    train_samples = Column(Integer)
+    test_samples = Column(Integer)
+    fp_rate = Column(Float)  # percentage of test days (normal behaviour) taken as anomalies
+    fit_time = Column(Float)  # seconds
+    predict_time = Column(Float)  # seconds
+    error = Column(String)
+
+
 def create_tables(db_engine):
     Base.metadata.create_all(db_engine)
@@ -0,0 +1,160 @@
+from dev_profile import DeveloperProfile
+
+from collections import namedtuple
+import configparser
+import threading
+import time
+import os
+
+# Data a rule can depend on, prefetched in the developer profile
+PROFILE_NEEDS = frozenset(('stats', 'owned_files', 'file_contributions', 'pulls', 'contributions'))
+
+Rule = namedtuple('Rule', ['name', 'kind', 'needs', 'thresholds', 'func'])
+# Registered rules by name, in declaration order
+RULES = {}
+
+
+def rule(kind, needs=(), thresholds=()):
+    """
+    Register a rule, evaluated as func(context).
+
+    Parameters
+    ----------
+    kind : string
+        'decision' rules return True when violated, 'trust' rules return True when the criterion is met
+    needs : tuple
+        Profile data used by the rule (see PROFILE_NEEDS)
+    thresholds : tuple
+        RuleValues fields used by the rule, checked when the rule is registered
+    """
+    unknown = (set(needs) - PROFILE_NEEDS) | (set(thresholds) - set(RuleValues._fields))
+    if unknown:
+        raise ValueError('Unknown needs or thresholds: %s' % ', '.join(sorted(unknown)))
+
+    def register(func):
+        RULES[func.__name__] = Rule(func.__name__, kind, frozenset(needs), tuple(thresholds), func)
+        return func
+    return register
+
+
+class RuleValues(namedtuple('RuleValues', [
+        'min_time_contributor', 'trust_threshold', 'few_commits_threshold', 'same_day_commits', 'rejected_pr',
+        'sensitive_files_threshold', 'sensitive_files', 'not_touched_files', 'owned_majority_files',
+        'new_files_outlier', 'contributions', 'outlier_band', 'accepted_violations', 'disabled'])):
+    """
+    Typed values of rules.ini at one point in time, never changed once built.
+
+    Rules are enabled by default, disabled holds the names switched off in the Enabled section.
+    """
+
+    @classmethod
+    def read(cls, path):
+        rules = configparser.ConfigParser()
+        rules.read(path)
+        disabled = frozenset(name for name in rules.options('Enabled') if not rules.getboolean('Enabled', name)) \
+            if rules.has_section('Enabled') else frozenset()
+        return cls(min_time_contributor=rules.getint('Trust', 'Min_Time_Contributor'),
+                   trust_threshold=rules.getfloat('Trust', 'Trust_Threshold'),
+                   few_commits_threshold=rules.getfloat('Trust', 'Few_Commits_Threshold'),
+                   same_day_commits=rules.getfloat('Trust', 'Same_Day_Commits'),
+                   rejected_pr=rules.getfloat('Trust', 'Rejected_PR'),
+                   sensitive_files_threshold=rules.getint('Rules', 'Sensitive_Files_Threshold'),
+                   sensitive_files=frozenset(rules['Rules']['Sensitive_Files'].split(',')),
+                   not_touched_files=rules.getfloat('Rules', 'Not_Touched_Files'),
+                   owned_majority_files=rules.getfloat('Rules', 'Owned_Majority_Files'),
+                   new_files_outlier=rules.getfloat('Rules', 'New_Files_Outlier'),
+                   contributions=rules.getint('Rules', 'Contributions'),
+                   outlier_band=rules.getfloat('Rules', 'Outlier_Band', fallback=1.0),
+                   accepted_violations=rules.getfloat('Rules', 'Accepted_Violations'),
+                   disabled=disabled)
+
+    def enabled(self, name):
+        return name not in self.disabled
+
+    def enabled_rules(self, kind):
+        return [rule for rule in RULES.values() if rule.kind == kind and self.enabled(rule.name)]
+
+
+class RuleConfig:
+    """
+    Current RuleValues of rules.ini, read again when the file changes.
+
+    A changed file is read into new RuleValues swapped in with a single assignment, so the worker threads always see
+    a whole snapshot, either the previous or the new one.
+    """
+
+    def __init__(self, path='rules.ini'):
+        self.path = path
+        self.mtime = None
+        self.values = None
+        self.lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """
+        Read rules.ini again if it changed since it was last read.
+        """
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        if mtime == self.mtime and self.values is not None:
+            return
+        with self.lock:
+            if mtime != self.mtime or self.values is None:
+                self.values = RuleValues.read(self.path)
+                self.mtime = mtime
+
+    def snapshot(self):
+        """
+        Get the current values, reloaded first if rules.ini changed.
+        """
+        self.reload()
+        return self.values
+
+
+def rule_needs(values):
+    """
+    Get the profile data needed by the enabled rules.
+    """
+    return frozenset().union(*(rule.needs for rule in RULES.values() if values.enabled(rule.name)))
+
+
+# Evaluation context given to every rule, deviations are the developer and repository deviations of the commit (see
+# baselines.Baselines.deviations) when already scored, None otherwise
+RuleContext = namedtuple('RuleContext', ['profile', 'config', 'added_files', 'touched_files', 'day', 'commit_data',
+                                         'deviations'], defaults=(None,))
+
+
+def run_rule(rule, context, outcomes):
+    start_time = time.perf_counter()
+    result = bool(rule.func(context))
+    outcomes[rule.name] = {'kind': rule.kind, 'result': result, 'time': time.perf_counter() - start_time}
+    return result
+
+
+def evaluate(session, config, username, added_files, touched_files, day, commit_data, profile=None, repo=None,
+             outcomes=None, deviations=None):
+    """
+    Run the enabled rules for a commit, prefetching only the profile data they need.
+
+    A not trusted developer counts as a violation, the score keeps the original scale of 7 rules (5 decision rules,
+    trust and the rule count of 2) when every rule is enabled.
+
+    Returns
+    -------
+    tuple
+        Percentage of violated rules and whether the user is trusted, outcomes is filled with the result and the time
+        (seconds) of each rule
+    """
+    # Every rule of the commit sees the same values, even if rules.ini changes meanwhile
+    values = config.snapshot()
+    if outcomes is None:
+        outcomes = {}
+    decision_rules = values.enabled_rules('decision')
+    trust_rules = values.enabled_rules('trust')
+    if profile is None:
+        profile = DeveloperProfile(session, username, repo, rule_needs(values))
+    context = RuleContext(profile, values, added_files, touched_files, day, commit_data, deviations)
+    violated = sum(1 for rule in decision_rules if run_rule(rule, context, outcomes))
+    met = sum(1 for rule in trust_rules if run_rule(rule, context, outcomes))
+    trusted = round(met / len(trust_rules), 1) >= values.trust_threshold if trust_rules else True
+    violated += 1 if not trusted else 0
+    return (violated / (len(decision_rules) + 2)) * 100, trusted
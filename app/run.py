@@ -1,45 +1,65 @@
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 import utils
-from models import create_tables
+from db import get_engine
+from bulk_writer import BulkWriter
+from file_index import FileIndex
+from git_ingest import commit_author_login, ingest_clone, read_mailmap
+from activity_rollup import rebuild_activity, verify_activity
+from contribution_index import rebuild_contributions
+from migrations import check_query_plans, upgrade_schema
+from stats_engine import calculate_stats
 from utils import *
 
 import configparser
 import time
-import os
 
 # Configuration read
 config = configparser.ConfigParser()
 config.read('config.ini')
 # Database configuration
-# db_engine = create_engine('sqlite:///project.db', echo=True)
-DB_NAME = config['Database']['DB_Name']
-db_engine = create_engine('sqlite:///' + DB_NAME)
+db_engine = get_engine()
 DBSession = sessionmaker(bind=db_engine)
-if not os.path.exists(DB_NAME):
-    create_tables(db_engine)
+# Missing tables, columns and indexes are added, so existing databases get the current schema
+upgrade_schema(db_engine)
 
 # Repository
 OWNER = config['Repository']['Owner']
 REPO = config['Repository']['Name']
+CLONE = config['Repository'].get('Clone', '')
+MAILMAP = config['Repository'].get('Mailmap', '')
+LOOKUP_AUTHORS = config['Repository'].getboolean('Lookup_Authors', fallback=True)
 
 
-def get_repository_info():
+def get_repository_info(incremental=False):
     """
     Get information from the repository
+
+    With incremental set, only the commits newer than each developer's last completed sync are requested.
+    An interrupted run resumes every developer from its last stored page in both modes.
     """
     with DBSession() as session:
         if session.query(Developer).count() == 0:
             get_contributors(OWNER, REPO, session)
         devs = session.query(Developer).all()
+        writer = BulkWriter(session, FileIndex(session))
         for dev in devs:
             print('\nGetting %s commits' % dev.username)
-            get_commits(OWNER, REPO, dev, session)
-            session.flush()
-            utils.calculate_global_dev_stats(session, dev.id)
-        session.commit()
-        utils.calculate_repo_stats(session)
+            get_commits(OWNER, REPO, dev, session, incremental, writer)
+
+
+def get_repository_info_from_clone():
+    """
+    Get the commits from a local (bare) clone instead of the REST API
+    """
+    with DBSession() as session:
+        if session.query(Developer).count() == 0:
+            get_contributors(OWNER, REPO, session)
+        lookup = (lambda sha: commit_author_login(OWNER, REPO, sha)) if LOOKUP_AUTHORS else None
+        stored, skipped, unknown = ingest_clone(CLONE, session, mailmap=read_mailmap(MAILMAP) if MAILMAP else None,
+                                                lookup=lookup)
+        print('Stored %s commits, skipped %s commits of %s author emails without a known developer'
+              % (stored, skipped, len(unknown)))
 
 
 def get_dev_commits(username):
@@ -93,10 +113,16 @@ def get_commits_user():
 start_time = time.time()
 with DBSession() as db_session:
     #calculate_daily_stats(db_session)
+    #rebuild_contributions(db_session)
+    #rebuild_activity(db_session)
+    #print('\n'.join(verify_activity(db_session)) or 'Activity rollup is consistent')
+    #print(check_query_plans(db_engine) or 'Every hot query uses an index')
     #get_pulls(OWNER, REPO, db_session)
-    utils.calculate_repo_stats(db_session)
+    calculate_stats(db_session)
 # get_commits_user()
 #get_repository_info()
+#get_repository_info(incremental=True)
+#get_repository_info_from_clone()
 #get_all_dev_daily_stats()
 # get_dev_commits('mlpcorreia')
 print('Execution time: %s seconds' % (time.time() - start_time))
@@ -0,0 +1,164 @@
+from models import Developer, Commits, DeveloperStats, RepoStats
+from sqlalchemy import func
+
+import math
+
+# Commit attributes summarized in DeveloperStats and RepoStats
+STATS_ATTRIBUTES = ('new_lines', 'removed_lines', 'added_files', 'modified_files', 'removed_files')
+# The repository stats are kept in a single row
+REPO_STATS_ID = 1
+
+
+def grouped_moments(session):
+    """
+    Get count, sum and sum of squares of every attribute for each developer, in a single GROUP BY pass.
+
+    Returns
+    -------
+    dict
+        Developer id to {attribute: (count, sum, sum of squares)}
+    """
+    columns = [Commits.developer_id]
+    for attr in STATS_ATTRIBUTES:
+        column = getattr(Commits, attr)
+        columns += [func.count(column), func.coalesce(func.sum(column), 0), func.coalesce(func.sum(column * column), 0)]
+    moments = {}
+    for row in session.query(*columns).group_by(Commits.developer_id):
+        moments[row[0]] = {attr: tuple(row[1 + i * 3:4 + i * 3]) for i, attr in enumerate(STATS_ATTRIBUTES)}
+    return moments
+
+
+def stats_row(moments):
+    """
+    Build the avg/var/std columns of a stats row from the (count, sum, sum of squares) of each attribute.
+
+    The variance is the sample variance, 0 when there are less than two values.
+    """
+    row = {'commit_count': 0}
+    for attr in STATS_ATTRIBUTES:
+        n, total, squares = moments.get(attr, (0, 0, 0))
+        var = max(0, (n * squares - total * total) / (n * (n - 1))) if n > 1 else 0
+        row['commit_count'] = max(row['commit_count'], n)
+        row[attr + '_avg'] = total / n if n else None
+        row[attr + '_var'] = var
+        row[attr + '_std'] = math.sqrt(var)
+    return row
+
+
+def calculate_stats(session):
+    """
+    Rebuild DeveloperStats for every developer and the RepoStats row from a single pass over the commits.
+    """
+    rebuild_stats(session)
+    session.commit()
+
+
+def rebuild_stats(session):
+    """
+    Rebuild the stats as calculate_stats, in the current transaction.
+    """
+    moments = grouped_moments(session)
+    dev_rows = []
+    for dev_id, in session.query(Developer.id):
+        row = stats_row(moments.get(dev_id, {}))
+        row['developer_id'] = dev_id
+        dev_rows.append(row)
+    # Repository totals are the sum of the moments of every developer
+    repo_moments = {attr: tuple(sum(dev[attr][i] for dev in moments.values()) for i in range(3))
+                    for attr in STATS_ATTRIBUTES}
+    repo_row = stats_row(repo_moments)
+    repo_row['id'] = REPO_STATS_ID
+    session.query(DeveloperStats).delete()
+    session.query(RepoStats).delete()
+    if dev_rows:
+        session.execute(DeveloperStats.__table__.insert(), dev_rows)
+    session.execute(RepoStats.__table__.insert(), [repo_row])
+
+
+def merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """
+    Merge the (count, mean, sum of squared deviations) of two sets of values (Chan et al. parallel algorithm).
+    """
+    n = n_a + n_b
+    if n == 0:
+        return 0, 0.0, 0.0
+    delta = mean_b - mean_a
+    return n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n
+
+
+def merge_into_stats(stats, values):
+    """
+    Merge the attribute values of new commits into a DeveloperStats or RepoStats row.
+
+    Parameters
+    ----------
+    stats : DeveloperStats or RepoStats
+        Stats row, updated in place
+    values : dict
+        Attribute to the list of values of the new commits
+    """
+    n_a = stats.commit_count or 0
+    n_b = len(values[STATS_ATTRIBUTES[0]])
+    for attr in STATS_ATTRIBUTES:
+        mean_a = getattr(stats, attr + '_avg') or 0.0
+        m2_a = (getattr(stats, attr + '_var') or 0.0) * (n_a - 1) if n_a > 1 else 0.0
+        mean_b = sum(values[attr]) / n_b
+        m2_b = sum((value - mean_b) ** 2 for value in values[attr])
+        n, mean, m2 = merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b)
+        var = m2 / (n - 1) if n > 1 else 0
+        setattr(stats, attr + '_avg', mean)
+        setattr(stats, attr + '_var', var)
+        setattr(stats, attr + '_std', math.sqrt(var))
+    stats.commit_count = n_a + n_b
+
+
+def add_commits_to_stats(session, commits):
+    """
+    Update DeveloperStats and RepoStats with newly stored commits, without going over the previous ones.
+
+    The rows are created when missing; on a database with commits but no stats, run calculate_stats once first.
+    Stats stored before commit_count existed (NULL) cannot be merged, so they are rebuilt with the new commits instead.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.Session
+        DB session used in ORM related operations
+    commits : list
+        Commits rows (dicts) of the new commits
+    """
+    if not commits:
+        return
+    # The new commits are already written in the transaction, so the rebuild includes them
+    if session.query(RepoStats.id).filter(RepoStats.commit_count.is_(None)).first() or \
+            session.query(DeveloperStats.developer_id).filter(DeveloperStats.commit_count.is_(None)).first():
+        rebuild_stats(session)
+        return
+    by_developer = {}
+    for commit in commits:
+        values = by_developer.setdefault(commit['developer_id'], {attr: [] for attr in STATS_ATTRIBUTES})
+        for attr in STATS_ATTRIBUTES:
+            values[attr].append(commit[attr] or 0)
+    for dev_id, values in by_developer.items():
+        if dev_id is None:
+            continue
+        dev_stats = session.get(DeveloperStats, dev_id, populate_existing=True)
+        if dev_stats is None:
+            dev_stats = DeveloperStats(developer_id=dev_id)
+            session.add(dev_stats)
+        merge_into_stats(dev_stats, values)
+    repo_stats = session.get(RepoStats, REPO_STATS_ID, populate_existing=True)
+    if repo_stats is None:
+        repo_stats = RepoStats(id=REPO_STATS_ID)
+        session.add(repo_stats)
+    merge_into_stats(repo_stats, {attr: [commit[attr] or 0 for commit in commits] for attr in STATS_ATTRIBUTES})
+
+
+def stats_fingerprint(session):
+    """
+    Get a cheap value that changes whenever commits are merged into DeveloperStats and RepoStats, or the stats are rebuilt
+    from a different set of commits.
+    """
+    repo_count = session.query(RepoStats.commit_count).filter(RepoStats.id == REPO_STATS_ID).scalar()
+    dev_rows, dev_count = session.query(func.count(DeveloperStats.developer_id),
+                                        func.sum(DeveloperStats.commit_count)).one()
+    return repo_count, dev_rows, dev_count
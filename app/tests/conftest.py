@@ -0,0 +1,77 @@
+import configparser
+import tempfile
+import shutil
+import sys
+import os
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app modules use flat imports and read config.ini and rules.ini from the working directory when imported, so
+# the tests run from a temporary copy of them, without the GitHub response cache
+sys.path.insert(0, APP_DIR)
+WORK_DIR = tempfile.mkdtemp()
+shutil.copy(os.path.join(APP_DIR, 'rules.ini'), WORK_DIR)
+config = configparser.ConfigParser()
+config.read(os.path.join(APP_DIR, 'config.ini'))
+config['Database']['Http_Cache'] = ''
+config['Model']['Directory'] = os.path.join(WORK_DIR, 'svm_models')
+with open(os.path.join(WORK_DIR, 'config.ini'), 'w') as config_file:
+    config.write(config_file)
+os.chdir(WORK_DIR)
+
+from bulk_writer import BulkWriter
+from db import get_engine
+from file_index import FileIndex
+from models import Developer, create_tables
+from sqlalchemy.orm import sessionmaker
+from utils import save_commit
+
+from datetime import datetime
+import pytest
+
+
+@pytest.fixture
+def DBSession(tmp_path):
+    """
+    Session factory of a new database with two developers, dev1 (id 1) and dev2 (id 2).
+    """
+    engine = get_engine('sqlite:///%s' % (tmp_path / 'test.db'))
+    create_tables(engine)
+    DBSession = sessionmaker(bind=engine)
+    with DBSession() as session:
+        session.add_all([Developer(id=1, username='dev1', account_creation=datetime(2020, 1, 1)),
+                         Developer(id=2, username='dev2', account_creation=datetime(2020, 1, 1))])
+        session.commit()
+    yield DBSession
+    engine.dispose()
+
+
+def commit_data(sha, filename, status='added', date='2022-01-01T10:00:00Z', previous_filename=None, additions=10,
+                deletions=2):
+    """
+    Build a commit detail payload, as returned by the GitHub commits endpoint, changing a single file.
+    """
+    file_data = {'filename': filename, 'status': status, 'patch': '+a'}
+    if previous_filename:
+        file_data['previous_filename'] = previous_filename
+    return {'sha': sha, 'commit': {'author': {'date': date}, 'message': 'Commit %s' % sha},
+            'stats': {'additions': additions, 'deletions': deletions}, 'files': [file_data]}
+
+
+def buffer_commits(session, commits, batch_size=1000):
+    """
+    Buffer commit detail payloads, given as (developer id, payload), in a new bulk writer without flushing it.
+    """
+    writer = BulkWriter(session, FileIndex(session), batch_size)
+    for developer_id, data in commits:
+        save_commit(data, session.get(Developer, developer_id), writer)
+    return writer
+
+
+def store_commits(session, commits, batch_size=1000):
+    """
+    Store commit detail payloads, given as (developer id, payload), through a new bulk writer.
+    """
+    writer = buffer_commits(session, commits, batch_size)
+    writer.flush()
+    return writer
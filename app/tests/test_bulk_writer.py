@@ -0,0 +1,39 @@
+from conftest import buffer_commits, commit_data, store_commits
+from models import Commits, CommitsFiles, File, RepoStats
+from stats_engine import REPO_STATS_ID
+
+
+def test_concurrent_writers(DBSession):
+    with DBSession() as session_a, DBSession() as session_b:
+        # Both writers buffer a commit adding the same file before any of them flushes
+        writer_a = buffer_commits(session_a, [(1, commit_data('a' * 40, 'a.py'))])
+        writer_b = buffer_commits(session_b, [(2, commit_data('b' * 40, 'a.py')), (2, commit_data('c' * 40, 'c.py'))])
+        writer_a.flush()
+        writer_b.flush()
+        assert session_a.query(Commits.id).count() == 3
+        assert session_a.query(File.id).filter_by(filename='a.py').count() == 1
+        assert session_a.query(CommitsFiles.commit_id).count() == 3
+        assert session_a.get(RepoStats, REPO_STATS_ID, populate_existing=True).commit_count == 3
+
+
+def test_commit_stored_by_another_writer(DBSession):
+    with DBSession() as session_a, DBSession() as session_b:
+        writer_a = buffer_commits(session_a, [(1, commit_data('a' * 40, 'a.py'))])
+        writer_b = buffer_commits(session_b, [(1, commit_data('a' * 40, 'a.py'))])
+        writer_a.flush()
+        writer_b.flush()
+        assert session_a.query(Commits.id).count() == 1
+        assert session_a.get(RepoStats, REPO_STATS_ID, populate_existing=True).commit_count == 1
+
+
+def test_backfill_shas(DBSession):
+    commits = [(1, commit_data('a' * 40, 'a.py')), (2, commit_data('b' * 40, 'b.py'))]
+    with DBSession() as session:
+        store_commits(session, commits)
+        # Stored before commits.sha existed
+        session.query(Commits).update({'sha': None})
+        session.commit()
+        store_commits(session, commits)
+        assert sorted(sha for sha, in session.query(Commits.sha)) == ['a' * 40, 'b' * 40]
+        assert session.get(RepoStats, REPO_STATS_ID, populate_existing=True).commit_count == 2
+        assert session.query(CommitsFiles.commit_id).count() == 2
@@ -0,0 +1,47 @@
+from contributions_cache import get_contributions
+from models import ContributionsCache
+import utils
+
+from requests import HTTPError, Response
+import pytest
+
+
+def response(status_code, body=b'{}'):
+    r = Response()
+    r.status_code = status_code
+    r._content = body
+    return r
+
+
+@pytest.fixture
+def search(monkeypatch):
+    """
+    Set the response of the GitHub commit search.
+    """
+    def set_response(status_code, body=b'{}'):
+        monkeypatch.setattr(utils.req_session, 'get', lambda url, **kwargs: response(status_code, body))
+    return set_response
+
+
+def test_user_contributions(search):
+    search(200, b'{"total_count": 12}')
+    assert utils.user_contributions('dev') == 12
+    search(422)
+    assert utils.user_contributions('dev') == 0
+    search(403)
+    with pytest.raises(HTTPError):
+        utils.user_contributions('dev')
+
+
+def test_unknown_user_is_cached(DBSession, search):
+    search(422)
+    with DBSession() as session:
+        assert get_contributions(session, 'unknown') == 0
+        assert session.get(ContributionsCache, 'unknown').contributions == 0
+
+
+def test_rate_limited_lookup_is_not_cached(DBSession, search):
+    search(403, b'{"message": "API rate limit exceeded"}')
+    with DBSession() as session:
+        assert get_contributions(session, 'dev') == 0
+        assert session.get(ContributionsCache, 'dev') is None
@@ -0,0 +1,8 @@
+from db import get_engine
+
+import pytest
+
+
+def test_only_sqlite():
+    with pytest.raises(ValueError):
+        get_engine('postgresql://localhost/anomalus3r')
@@ -0,0 +1,75 @@
+from conftest import commit_data, store_commits
+from models import CommitsFiles, Commits, DeveloperFiles, File, FileRename
+
+from datetime import datetime
+import pytest
+
+# dev1 renames a.py to b.py in 2020 after changing it in 2019, dev2 adds a new a.py in 2022
+DEV1_COMMITS = [(1, commit_data('1' * 40, 'b.py', 'renamed', '2020-01-01T10:00:00Z', previous_filename='a.py')),
+                (1, commit_data('2' * 40, 'a.py', 'modified', '2019-01-01T10:00:00Z'))]
+DEV2_COMMITS = [(2, commit_data('3' * 40, 'a.py', 'added', '2022-01-01T10:00:00Z'))]
+# dev2 adds a.py in 2019 and renames it to b.py in 2020, dev1 renames b.py to c.py in 2021
+CHAIN_DEV1 = [(1, commit_data('4' * 40, 'c.py', 'renamed', '2021-01-01T10:00:00Z', previous_filename='b.py'))]
+CHAIN_DEV2 = [(2, commit_data('5' * 40, 'b.py', 'renamed', '2020-01-01T10:00:00Z', previous_filename='a.py')),
+              (2, commit_data('6' * 40, 'a.py', 'added', '2019-01-01T10:00:00Z'))]
+
+
+def commit_files(session):
+    return dict(session.query(Commits.sha, File.filename).join(CommitsFiles, CommitsFiles.commit_id == Commits.id)
+                .join(File, File.id == CommitsFiles.file_id))
+
+
+@pytest.mark.parametrize('dev1_first', [True, False])
+def test_reused_path(DBSession, dev1_first):
+    with DBSession() as session:
+        # One developer at a time, newest first, as get_repository_info
+        store_commits(session, DEV1_COMMITS + DEV2_COMMITS if dev1_first else DEV2_COMMITS + DEV1_COMMITS)
+        assert commit_files(session) == {'1' * 40: 'b.py', '2' * 40: 'b.py', '3' * 40: 'a.py'}
+        assert dict(session.query(File.filename, File.developer_id)) == {'a.py': 2, 'b.py': None}
+
+
+def test_reused_path_in_later_writer(DBSession):
+    with DBSession() as session:
+        store_commits(session, DEV1_COMMITS)
+        # The renames are loaded from the stored files
+        store_commits(session, DEV2_COMMITS)
+        assert commit_files(session)['3' * 40] == 'a.py'
+        assert session.query(File.id).count() == 2
+
+
+def file_renames(session):
+    return session.query(FileRename.previous_filename, FileRename.filename, FileRename.renamed_at)\
+        .order_by(FileRename.renamed_at).all()
+
+
+@pytest.mark.parametrize('dev1_first', [True, False])
+@pytest.mark.parametrize('same_writer', [True, False])
+def test_rename_chain(DBSession, dev1_first, same_writer):
+    first, second = (CHAIN_DEV1, CHAIN_DEV2) if dev1_first else (CHAIN_DEV2, CHAIN_DEV1)
+    with DBSession() as session:
+        if same_writer:
+            store_commits(session, first + second)
+        else:
+            store_commits(session, first)
+            store_commits(session, second)
+        assert commit_files(session) == {'4' * 40: 'c.py', '5' * 40: 'c.py', '6' * 40: 'c.py'}
+        assert session.query(File.filename, File.previous_filename, File.developer_id).all() == [('c.py', 'a.py', 2)]
+        assert file_renames(session) == [('a.py', 'b.py', datetime(2020, 1, 1, 10)),
+                                         ('b.py', 'c.py', datetime(2021, 1, 1, 10))]
+        # Every link of the chain is loaded again, not only the one kept in the File row
+        store_commits(session, [(1, commit_data('7' * 40, 'b.py', 'modified', '2020-06-01T10:00:00Z'))])
+        assert commit_files(session)['7' * 40] == 'c.py'
+        assert dict(session.query(DeveloperFiles.developer_id, DeveloperFiles.touches)) == {1: 2, 2: 2}
+
+
+def test_rename_chain_of_stored_files(DBSession):
+    with DBSession() as session:
+        store_commits(session, [(1, commit_data('8' * 40, 'c.py', 'modified', '2022-01-01T10:00:00Z'))])
+        store_commits(session, CHAIN_DEV2)
+        # The rename shows the stored rows of b.py and c.py are the same file
+        store_commits(session, CHAIN_DEV1)
+        assert commit_files(session) == {'4' * 40: 'c.py', '5' * 40: 'c.py', '6' * 40: 'c.py', '8' * 40: 'c.py'}
+        file_id, = session.query(File.id).one()
+        assert session.query(FileRename.file_id).distinct().all() == [(file_id,)]
+        assert session.query(DeveloperFiles.developer_id, DeveloperFiles.file_id, DeveloperFiles.touches)\
+            .order_by(DeveloperFiles.developer_id).all() == [(1, file_id, 2), (2, file_id, 2)]
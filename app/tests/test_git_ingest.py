@@ -0,0 +1,74 @@
+from git_ingest import ingest_clone, read_mailmap
+from models import Commits, CommitsFiles, File
+
+import subprocess
+
+DEV1 = ('Dev One', '1+dev1@users.noreply.github.com')
+DEV2 = ('Dev Two', 'two@example.com')
+OTHER = ('Someone Else', 'someone@example.com')
+
+
+def git(repo, *args, author=None, date=None):
+    env = {'HOME': str(repo), 'GIT_CONFIG_NOSYSTEM': '1'}
+    if author:
+        env.update(GIT_AUTHOR_NAME=author[0], GIT_AUTHOR_EMAIL=author[1], GIT_COMMITTER_NAME=author[0],
+                   GIT_COMMITTER_EMAIL=author[1])
+    if date:
+        env.update(GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date)
+    return subprocess.run(['git', '-C', str(repo)] + list(args), env=env, check=True, capture_output=True,
+                          text=True).stdout.strip()
+
+
+def commit(repo, author, date, message):
+    git(repo, 'add', '-A')
+    git(repo, 'commit', '-q', '-m', message, author=author, date=date)
+    return git(repo, 'rev-parse', 'HEAD')
+
+
+def make_repo(repo):
+    """
+    Build a repository with a rename, a binary file, a merge and a commit of an unknown author.
+    """
+    git(repo, 'init', '-q', '-b', 'main')
+    (repo / 'a.py').write_text('\n'.join('line %s' % i for i in range(20)) + '\n')
+    shas = {'add': commit(repo, DEV1, '2022-01-01T10:00:00Z', 'Add a.py')}
+    git(repo, 'mv', 'a.py', 'b.py')
+    shas['rename'] = commit(repo, DEV2, '2022-01-02T10:00:00Z', 'Rename a.py')
+    git(repo, 'checkout', '-q', '-b', 'feature')
+    (repo / 'logo.png').write_bytes(b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR' + bytes(range(256)))
+    shas['binary'] = commit(repo, DEV2, '2022-01-03T10:00:00Z', 'Add a logo')
+    git(repo, 'checkout', '-q', 'main')
+    (repo / 'c.py').write_text('print(1)\n')
+    shas['unknown'] = commit(repo, OTHER, '2022-01-04T10:00:00Z', 'Add c.py')
+    git(repo, 'merge', '-q', '--no-ff', '-m', 'Merge feature', 'feature', author=DEV1, date='2022-01-05T10:00:00Z')
+    shas['merge'] = git(repo, 'rev-parse', 'HEAD')
+    return shas
+
+
+def test_ingest_clone(DBSession, tmp_path):
+    repo = tmp_path / 'repo'
+    repo.mkdir()
+    shas = make_repo(repo)
+    mailmap_path = tmp_path / 'mailmap'
+    mailmap_path.write_text('# Login <email>\ndev2 <Two@Example.com>\n')
+    lookups = []
+
+    def lookup(sha):
+        lookups.append(sha)
+        return None
+    with DBSession() as session:
+        stored, skipped, unknown = ingest_clone(str(repo / '.git'), session, mailmap=read_mailmap(mailmap_path),
+                                                lookup=lookup)
+        # The merge is not ingested, the commit of the unknown author is skipped after one lookup of its email
+        assert (stored, skipped, unknown) == (3, 1, {OTHER[1]})
+        assert lookups == [shas['unknown']]
+        commits = dict(session.query(Commits.sha, Commits.developer_id))
+        assert commits == {shas['add']: 1, shas['rename']: 2, shas['binary']: 2}
+        files = dict(session.query(Commits.sha, File.filename).join(CommitsFiles, CommitsFiles.commit_id == Commits.id)
+                     .join(File, File.id == CommitsFiles.file_id))
+        assert files == {shas['add']: 'b.py', shas['rename']: 'b.py', shas['binary']: 'logo.png'}
+        assert session.query(File.previous_filename).filter_by(filename='b.py').scalar() == 'a.py'
+        # A pure rename and a binary file have no changed lines
+        lines = {sha: (new_lines, removed_lines) for sha, new_lines, removed_lines in
+                 session.query(Commits.sha, Commits.new_lines, Commits.removed_lines)}
+        assert lines == {shas['add']: (20, 0), shas['rename']: (0, 0), shas['binary']: (0, 0)}
@@ -0,0 +1,49 @@
+from conftest import commit_data, store_commits
+from migrations import upgrade_schema
+from models import DailyActivity, DeveloperActivity, DeveloperFiles, DeveloperStats, File, FileRename, \
+    RepoStats
+from sqlalchemy import text
+from stats_engine import REPO_STATS_ID
+
+from datetime import datetime
+
+
+def test_upgrade_fills_activity(DBSession):
+    with DBSession() as session:
+        store_commits(session, [(1, commit_data('a' * 40, 'a.py')),
+                                (2, commit_data('b' * 40, 'b.py', date='2022-01-02T10:00:00Z'))])
+        # Database created before the rollup tables
+        session.execute(text('DROP TABLE daily_activity'))
+        session.execute(text('DROP TABLE developer_activity'))
+        session.commit()
+        upgrade_schema(session.get_bind())
+        assert session.query(DailyActivity.commits).order_by(DailyActivity.date).all() == [(1,), (1,)]
+        assert session.query(DeveloperActivity.developer_id).order_by(DeveloperActivity.date).all() == [(1,), (2,)]
+
+
+def test_upgrade_rebuilds_stats_and_contributions(DBSession):
+    with DBSession() as session:
+        store_commits(session, [(1, commit_data('a' * 40, 'a.py')), (1, commit_data('b' * 40, 'b.py'))])
+        # Database created before commit_count and the contribution index
+        session.execute(text('DROP TABLE developer_files'))
+        session.execute(text('ALTER TABLE developer_stats DROP COLUMN commit_count'))
+        session.execute(text('ALTER TABLE repo_stats DROP COLUMN commit_count'))
+        session.commit()
+        upgrade_schema(session.get_bind())
+        assert session.get(DeveloperStats, 1).commit_count == 2
+        assert session.get(RepoStats, REPO_STATS_ID).commit_count == 2
+        assert session.query(DeveloperFiles.file_id).filter_by(developer_id=1).count() == 2
+
+
+def test_upgrade_backfills_renamed_at(DBSession):
+    with DBSession() as session:
+        store_commits(session, [(1, commit_data('a' * 40, 'b.py', 'renamed', '2020-01-01T10:00:00Z',
+                                                previous_filename='a.py'))])
+        # Database created before renamed_at and file_rename
+        session.execute(text('ALTER TABLE file DROP COLUMN renamed_at'))
+        session.execute(text('DROP TABLE file_rename'))
+        session.commit()
+        upgrade_schema(session.get_bind())
+        assert session.query(File.renamed_at).filter_by(filename='b.py').scalar() == datetime(2020, 1, 1, 10)
+        assert session.query(FileRename.previous_filename, FileRename.filename, FileRename.renamed_at).all() == \
+            [('a.py', 'b.py', datetime(2020, 1, 1, 10))]
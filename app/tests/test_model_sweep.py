@@ -0,0 +1,23 @@
+from behaviour_features import FEATURE_COLUMNS
+from model_sweep import best_params, sweep_developer
+from models import SweepResult
+
+import numpy as np
+
+
+def test_sweep_developer():
+    data = np.random.default_rng(1).random((10, len(FEATURE_COLUMNS)))
+    grid = {'kernel': ['rbf'], 'gamma': ['scale'], 'nu': [0.1, 0.5], 'scaler': ['minmax'], 'features': ['all']}
+    rows = sweep_developer(1, data, grid)
+    assert len(rows) == 2
+    assert all(row['error'] is None and 0 <= row['fp_rate'] <= 100 for row in rows)
+
+
+def test_best_params_closest_to_nu(DBSession):
+    with DBSession() as session:
+        # The permissive model never flags a test day, the calibrated one flags about nu of them
+        for kernel, nu, fp_rate in (('linear', 0.1, 0.0), ('rbf', 0.2, 25.0), ('poly', 0.1, 60.0)):
+            session.add(SweepResult(sweep_id=1, developer_id=1, kernel=kernel, gamma='auto', nu=nu, scaler='minmax',
+                                    features='all', fp_rate=fp_rate, fit_time=0.1))
+        session.commit()
+        assert best_params(session, 1)[1].kernel == 'rbf'
@@ -0,0 +1,9 @@
+from db import get_engine
+from migrations import check_query_plans, upgrade_schema
+
+
+def test_hot_queries_use_indexes(tmp_path):
+    engine = get_engine('sqlite:///%s' % (tmp_path / 'plans.db'))
+    upgrade_schema(engine)
+    assert check_query_plans(engine) == []
+    engine.dispose()
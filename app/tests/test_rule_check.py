@@ -0,0 +1,84 @@
+from baselines import Baselines
+from rule_check import rules_violated
+from rule_engine import RuleConfig, rule
+from stats_engine import STATS_ATTRIBUTES
+
+from types import SimpleNamespace
+import numpy as np
+import shutil
+import pytest
+import os
+
+
+def make_profile(touched_files=(), number_files=10):
+    # Without baselines for the developer and the repository, so outlier_check is never violated
+    missing = np.full((2, len(STATS_ATTRIBUTES)), np.nan)
+    repo = SimpleNamespace(baselines=Baselines([], missing, missing))
+    return SimpleNamespace(repo=repo, dev_id=1, developer=None, first_commit=False, number_files=number_files,
+                           total_commits=10, commit_count=5, touched_files=set(touched_files),
+                           file_contributions={filename: 10 for filename in touched_files}, owned_files=set(),
+                           contributions=1, pulls=0, rejected_pulls=0, commits_on=lambda day: (None, None))
+
+
+def commit_data(statuses):
+    return {'stats': {'additions': 10, 'deletions': 0},
+            'files': [{'filename': 'file%d.py' % i, 'status': status} for i, status in enumerate(statuses)]}
+
+
+def test_add_only_commit():
+    outcomes = {}
+    rules_violated(None, 'dev', ['file0.py'], set(), '2024-01-01', commit_data(['added']), make_profile(['a.py']),
+                   outcomes)
+    assert outcomes['not_first_never_touched']['result'] is False
+    assert outcomes['not_first_owned_files']['result'] is False
+
+
+def test_never_touched_files():
+    outcomes = {}
+    rules_violated(None, 'dev', [], {'b.py'}, '2024-01-01', commit_data(['modified']), make_profile(['a.py']),
+                   outcomes)
+    assert outcomes['not_first_never_touched']['result'] is True
+
+
+def test_repository_without_files():
+    outcomes = {}
+    rules_violated(None, 'dev', [], {'b.py'}, '2024-01-01', commit_data(['modified']), make_profile(number_files=0),
+                   outcomes)
+    assert outcomes['not_first_owned_files']['result'] is False
+
+
+def test_trust_rules_without_stored_commits():
+    profile = make_profile()
+    profile.total_commits = 0
+    profile.commits_on = lambda day: (2, None)
+    outcomes = {}
+    rules_violated(None, 'dev', [], {'b.py'}, '2024-01-01', commit_data(['modified']), profile, outcomes)
+    assert outcomes['commits_threshold']['result'] is False
+    assert outcomes['commits_per_day']['result'] is False
+
+
+def test_outlier_check_with_scored_deviations():
+    outcomes = {}
+    deviations = (np.full((1, len(STATS_ATTRIBUTES)), np.nan), np.array([[0.5, np.inf, 0, 0, 0]]))
+    rules_violated(None, 'dev', [], {'b.py'}, '2024-01-01', commit_data(['modified']), make_profile(), outcomes,
+                   deviations)
+    assert outcomes['outlier_check']['result'] is True
+
+
+def test_unknown_threshold():
+    with pytest.raises(ValueError):
+        rule('decision', thresholds=('no_such_threshold',))
+
+
+def test_reload_swaps_snapshot(tmp_path):
+    path = tmp_path / 'rules.ini'
+    shutil.copy('rules.ini', path)
+    config = RuleConfig(str(path))
+    values = config.snapshot()
+    path.write_text(path.read_text().replace('Outlier_Band = 1', 'Outlier_Band = 2') + 'outlier_check = no\n')
+    mtime = os.path.getmtime(path) + 10
+    os.utime(path, (mtime, mtime))
+    new_values = config.snapshot()
+    # Values taken before the reload are left as they were
+    assert (values.outlier_band, values.enabled('outlier_check')) == (1.0, True)
+    assert (new_values.outlier_band, new_values.enabled('outlier_check')) == (2.0, False)
@@ -0,0 +1,45 @@
+from conftest import commit_data, store_commits
+from models import DeveloperStats, RepoStats
+from stats_engine import REPO_STATS_ID, STATS_ATTRIBUTES, calculate_stats
+
+import random
+import pytest
+
+STATS_COLUMNS = ['commit_count'] + [attr + suffix for attr in STATS_ATTRIBUTES for suffix in ('_avg', '_var', '_std')]
+
+
+def stats_values(session):
+    rows = session.query(DeveloperStats).order_by(DeveloperStats.developer_id).all() + \
+        [session.get(RepoStats, REPO_STATS_ID)]
+    return [[getattr(row, column) for column in STATS_COLUMNS] for row in rows]
+
+
+def test_incremental_stats_match_rebuild(DBSession):
+    generator = random.Random(1)
+    statuses = ('added', 'modified', 'removed')
+    commits = [(generator.choice((1, 2)), commit_data('%040x' % i, 'f%d.py' % i, generator.choice(statuses),
+                                                      additions=generator.randint(0, 500),
+                                                      deletions=generator.randint(0, 200)))
+               for i in range(200)]
+    with DBSession() as session:
+        # Merged into the stats one small batch at a time
+        store_commits(session, commits, batch_size=7)
+        merged = stats_values(session)
+        calculate_stats(session)
+        rebuilt = stats_values(session)
+    assert len(merged) == 3
+    for merged_row, rebuilt_row in zip(merged, rebuilt):
+        assert merged_row == pytest.approx(rebuilt_row)
+
+
+def test_merge_into_stats_without_commit_count(DBSession):
+    with DBSession() as session:
+        store_commits(session, [(1, commit_data('a' * 40, 'a.py')), (1, commit_data('b' * 40, 'b.py'))])
+        calculate_stats(session)
+        # Stats stored before commit_count existed
+        session.query(RepoStats).update({'commit_count': None})
+        session.query(DeveloperStats).update({'commit_count': None})
+        session.commit()
+        store_commits(session, [(1, commit_data('c' * 40, 'c.py'))])
+        assert session.get(RepoStats, REPO_STATS_ID).commit_count == 3
+        assert session.get(DeveloperStats, 1).commit_count == 3
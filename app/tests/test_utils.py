@@ -0,0 +1,52 @@
+from conftest import commit_data
+from models import Developer, SyncState
+import utils
+
+from datetime import datetime
+
+
+def test_high_water_mark_from_synced_commits(DBSession, monkeypatch):
+    listed = [commit_data('2' * 40, 'b.py', date='2022-01-01T10:00:00Z'),
+              commit_data('1' * 40, 'a.py', date='2021-01-01T10:00:00Z')]
+    details = {commit['sha']: commit for commit in listed}
+
+    def api_get(url):
+        if '/commits?' not in url:
+            return details[url]
+        return [{'sha': commit['sha'], 'url': commit['sha'], 'parents': [{}]} for commit in listed] \
+            if url.endswith('&page=1') else []
+    monkeypatch.setattr(utils, 'api_get', api_get)
+    with DBSession() as session:
+        dev = session.get(Developer, 1)
+        # Accepted by the webhook while older commits of the developer are not stored yet
+        utils.store_commit(commit_data('3' * 40, 'c.py', date='2023-01-01T10:00:00Z'), dev, session)
+        utils.get_commits('owner', 'repo', dev, session)
+        sync_state = session.get(SyncState, dev.id)
+        assert (sync_state.last_commit_timestamp, sync_state.last_commit_sha) == (datetime(2022, 1, 1, 10), '2' * 40)
+        assert sync_state.page is None and sync_state.pending_commit_timestamp is None
+
+
+def test_no_write_transaction_during_fetch(DBSession, monkeypatch):
+    merged = dict(commit_data('4' * 40, 'd.py'), author={'login': 'dev2'})
+    other = dict(commit_data('5' * 40, 'e.py'), author=None)
+    listing = [{'sha': '6' * 40, 'url': '6' * 40, 'parents': [{'url': '4' * 40}, {'url': '5' * 40}]},
+               {'sha': '7' * 40, 'url': '7' * 40, 'parents': [{}]}]
+    details = {'4' * 40: merged, '5' * 40: other, '7' * 40: commit_data('7' * 40, 'f.py', date='2023-01-01T10:00:00Z')}
+    in_transaction = []
+
+    def api_get(url):
+        if '/commits?' not in url:
+            return details[url]
+        return listing if url.endswith('&page=1') else []
+
+    def get_developer(username, session):
+        in_transaction.append(session.connection().connection.in_transaction)
+        return get_developer.original(username, session)
+    get_developer.original = utils.get_developer
+    monkeypatch.setattr(utils, 'api_get', api_get)
+    monkeypatch.setattr(utils, 'get_developer', get_developer)
+    with DBSession() as session:
+        utils.get_commits('owner', 'repo', session.get(Developer, 1), session)
+        # The new sync state is not flushed by the merge developer queries
+        assert in_transaction == [False]
+        assert session.get(SyncState, 1).last_commit_sha == '7' * 40
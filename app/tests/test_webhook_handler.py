@@ -0,0 +1,66 @@
+from models import Verdict
+import webhook_handler
+
+from datetime import datetime
+import numpy as np
+import pytest
+import json
+
+
+@pytest.fixture(scope='module')
+def client():
+    with webhook_handler.DBSession() as session:
+        session.query(Verdict).delete()
+        for day in (1, 2, 3):
+            session.add(Verdict(commit_sha=str(day), username='dev', timestamp=datetime(2024, 1, day, 10),
+                                created_at=datetime(2024, 1, day, 10), violated=0.0, trusted=True, accepted=True,
+                                rules='{}', evaluation_time=0.0))
+        session.commit()
+    return webhook_handler.app.test_client()
+
+
+def test_verdicts_time_range(client):
+    response = client.get('/verdicts', query_string={'since': '2024-01-02', 'until': '2024-01-02T12:00:00Z'})
+    assert response.status_code == 200
+    assert [verdict['commit'] for verdict in response.get_json()['verdicts']] == ['2']
+
+
+def test_verdicts_aware_time(client):
+    # 2024-01-02 11:00 at UTC+2 is 09:00 UTC, before the verdict of that day
+    response = client.get('/verdicts', query_string={'until': '2024-01-02T11:00:00+02:00'})
+    assert [verdict['commit'] for verdict in response.get_json()['verdicts']] == ['1']
+
+
+def test_verdicts_bad_time(client):
+    assert client.get('/verdicts', query_string={'since': 'yesterday'}).status_code == 400
+
+
+def test_deviation_values_are_valid_json():
+    values = webhook_handler.deviation_values(np.array([np.nan, np.inf, -np.inf, 1.5, 0.0]))
+    assert values == {'new_lines': None, 'removed_lines': 'inf', 'added_files': '-inf', 'modified_files': 1.5,
+                      'removed_files': 0.0}
+    json.dumps(values, allow_nan=False)
+
+
+def push_commit(**fields):
+    commit = {'id': 'a' * 40, 'url': 'https://api.github.com/repos/o/r/commits/' + 'a' * 40,
+              'timestamp': '2024-01-01T10:00:00+01:00', 'author': {'name': 'Dev', 'username': 'dev'},
+              'added': [], 'removed': [], 'modified': ['a.py']}
+    commit.update(fields)
+    return commit
+
+
+def test_valid_commit():
+    assert webhook_handler.valid_commit(push_commit())
+    # Author email not linked to a GitHub account
+    assert not webhook_handler.valid_commit(push_commit(author={'name': 'Dev', 'email': 'dev@example.com'}))
+    assert not webhook_handler.valid_commit(push_commit(timestamp='yesterday'))
+    assert not webhook_handler.valid_commit(push_commit(added=None))
+
+
+def test_push_payload_rejected(client):
+    assert client.post('/push-payload', json=[push_commit()]).status_code == 400
+    assert client.post('/push-payload', json={'commits': push_commit()}).status_code == 400
+    assert client.post('/push-payload', json={'commits': [push_commit(), push_commit(author={'name': 'Dev'})]})\
+        .status_code == 400
+    assert client.post('/push-payload', json={'commits': []}).status_code == 201
@@ -1,107 +1,86 @@
-from models import Developer, Commits, File, CommitsStats, Pull, CommitsFiles, DeveloperStats, RepoStats
+from models import Developer, Commits, CommitsStats, Pull, SyncState
+from bulk_writer import BulkWriter
+from diff_stats import commit_diff_stats
+from file_index import FileIndex
+from http_cache import HttpCache
 from sqlalchemy import desc, func
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import groupby
+from requests.adapters import HTTPAdapter
 import configparser
-import sqlalchemy
 import statistics
 import requests
-import math
 import json
 
 # Read configs
 config = configparser.ConfigParser()
 config.read('config.ini')
 API_URL = config['Github']['Url']
+MAX_WORKERS = config.getint('Github', 'Max_Workers', fallback=8)
 # Initialize request session
 req_session = requests.Session()
+# One pooled connection per worker so concurrent fetches do not discard connections
+req_session.mount('https://', HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS))
 req_session.auth = (config['Github']['Username'], config['Github']['Token'])
 req_session.headers.update({'Accept': 'application/vnd.github.v3+json'})
+# Response cache stored next to the DB, disabled when no file is configured
+HTTP_CACHE = config['Database'].get('Http_Cache', '')
+http_cache = HttpCache(HTTP_CACHE) if HTTP_CACHE else None
+
+
+def api_get(url):
+    """
+    Get the decoded JSON body of a GitHub API resource, going through the response cache when enabled.
+    """
+    if http_cache:
+        return http_cache.get(req_session, url)
+    return req_session.get(url).json()
 
 
 def user_contributions(username):
+    """
+    Get the number of commits authored by a user in the GitHub commit search, 0 for an unknown user.
+
+    Any other error response (e.g. rate limited) raises requests.HTTPError instead of counting as no contributions.
+    """
     r = req_session.get(API_URL + 'search/commits?q=author:{}'.format(username))
-    resp_json = r.json()
-    if 'total_count' in resp_json:
-        return resp_json['total_count']
-    else:
-        return '0'
+    # The search rejects an author that does not exist
+    if r.status_code == 422:
+        return 0
+    r.raise_for_status()
+    return r.json()['total_count']
 
 
 def get_commit_info(commit_url):
-    return req_session.get(commit_url).json()
+    return api_get(commit_url)
 
 
 def get_developer(username, session):
     return session.query(Developer).filter_by(username=username).one_or_none()
 
 
-def get_file(session, query):
-    """
-    Get a File from the database based on a filename.
-
-    Parameters
-    ----------
-    session : sqlalchemy.orm.Session
-        DB session used in ORM related operations
-    query : string
-        Filename to be queried in the File table
-
-    Returns
-    -------
-    File
-        File object or None if there is no object in the DB with the specified filename
-    """
-    file = session.query(File).filter_by(filename=query).one_or_none()
-    if not file:
-        file = session.query(File).filter_by(previous_filename=query).one_or_none()
-    return file
-
-
-def save_file_changes(commit_data, commit, db_session, dev):
-    languages = {}
-    changed_chars = 0
-    added = 0
-    modified = 0
-    removed = 0
-    renamed = 0
+def save_file_changes(commit_data, commit, dev, file_index):
+    associations = {}
     for file_data in commit_data['files']:
         filename = file_data['filename']
-        file_type = filename[filename.rfind('.') + 1:]
-        if file_type not in languages:
-            languages[file_type] = 1
-        else:
-            languages[file_type] = languages[file_type] + 1
-        # Count characters changed per file
-        if 'patch' in file_data:
-            commit_changes = file_data['patch'].split('\n')
-            for line_change in commit_changes:
-                if line_change[0] == '+' or line_change[0] == '-':
-                    changed_chars += len(line_change)
-        file = get_file(db_session, filename)
+        file = file_index.resolve(filename, commit['timestamp'])
         if not file:
-            file = File(filename=filename)
-            file.commit.status = file_data['status']
+            file = file_index.create(filename)
         if file_data['status'] == 'renamed':
-            # Check if there was a file with the same name in a most recent commit
-            previous_file = db_session.query(File).filter_by(previous_filename=file_data['previous_filename']).one_or_none()
-            if previous_file:
-                previous_file.previous_filename = ''
-                db_session.add(previous_file)
-                db_session.commit()
-            file.previous_filename = file_data['previous_filename']
-        if file and file_data['status'] == 'added':
-            file.owner = dev
-            file.commit.status = file_data['status']
-        if file:
-            if not any(obj.file.filename == file.filename for obj in commit.files):
-                commit.files.append(CommitsFiles(file=file, status=file_data['status']))
-        added += (1 if file_data['status'] == 'added' else 0)
-        modified += (1 if file_data['status'] == 'modified' else 0)
-        removed += (1 if file_data['status'] == 'removed' else 0)
-        renamed += (1 if file_data['status'] == 'renamed' else 0)
-    commit.languages = json.dumps(languages)
-    return changed_chars, added, modified, removed, renamed
+            file = file_index.rename(file, file_data['previous_filename'], filename, commit['timestamp'])
+        file_index.seen(file, commit['timestamp'])
+        if file_data['status'] == 'added':
+            file_index.update(file, developer_id=dev.id)
+        # Two filenames of the same rename chain can resolve to the same file, new files have no id yet
+        if id(file) not in associations:
+            associations[id(file)] = {'file': file, 'status': file_data['status']}
+    stats = commit_diff_stats(commit_data['files'])
+    commit['languages'] = json.dumps(stats['extensions'])
+    commit.update(changed_chars=stats['changed_chars'], added_files=stats['added'], modified_files=stats['modified'],
+                  removed_files=stats['removed'], renamed_files=stats['renamed'])
+    return list(associations.values())
 
 
 def get_mean_and_variance(values):
@@ -114,135 +93,240 @@ def get_mean_and_variance(values):
     return mean, var
 
 
-def daily_commit_stats(session, date, developer_id, lines_changed, changed_chars, commits_time, commits_messages_len,
-                       added_files, modified_files, removed_files):
+def daily_commit_stats(date, developer_id, commits):
+    """
+    Build the CommitsStats row of one developer's day.
+
+    Parameters
+    ----------
+    date : datetime.date
+        Day of the commits
+    developer_id : int
+        Author of the commits
+    commits : list
+        Commit rows of the day, newest first
+
+    Returns
+    -------
+    dict
+        CommitsStats row
+    """
+    lines_changed = [commit.new_lines + commit.removed_lines for commit in commits]
+    changed_chars = [commit.changed_chars for commit in commits]
+    commits_time = [commit.timestamp for commit in commits]
+    commits_messages_len = [commit.message_length for commit in commits]
     # Lines changed mean and variance
     lines_mean, lines_variance = get_mean_and_variance(lines_changed)
     # Chars changed mean and variance
     chars_mean, chars_variance = get_mean_and_variance(changed_chars)
     # Calculate time intervals between commits made in the same day
-    time_intervals = []
-    if len(commits_time) > 1:
-        for i in range(0, len(commits_time)):
-            if len(commits_time) == i + 1:
-                break
-            delta = commits_time[i] - commits_time[i + 1]
-            time_intervals.append(delta.total_seconds())
+    time_intervals = [(commits_time[i] - commits_time[i + 1]).total_seconds() for i in range(len(commits_time) - 1)]
     times_mean, times_variance = get_mean_and_variance(time_intervals)
     comments_size_mean, comments_size_var = get_mean_and_variance(commits_messages_len)
-    added_files_mean, added_files_var = get_mean_and_variance(added_files)
-    modified_files_mean, modified_files_var = get_mean_and_variance(modified_files)
-    removed_files_mean, removed_files_var = get_mean_and_variance(removed_files)
-    commit_stats = CommitsStats(date=date, number_commits=len(lines_changed), time_intervals_min=min(commits_time),
-                                time_intervals_max=max(commits_time), time_intervals_mean=times_mean,
-                                time_intervals_var=times_variance, changed_lines_min=min(lines_changed),
-                                changed_lines_max=max(lines_changed), changed_lines_mean=lines_mean,
-                                changed_lines_var=lines_variance, changed_chars_min=min(changed_chars),
-                                changed_chars_max=max(changed_chars), changed_chars_mean=chars_mean,
-                                changed_chars_var=chars_variance, comments_size_min=min(commits_messages_len),
-                                comments_size_max=max(commits_messages_len), comments_size_mean=comments_size_mean,
-                                comments_size_var=comments_size_var, added_files_mean=added_files_mean,
-                                added_files_var=added_files_var, modified_files_mean=modified_files_mean,
-                                modified_files_var=modified_files_var, removed_files_mean=removed_files_mean,
-                                removed_files_var=removed_files_var, developer_id=developer_id)
-    session.add(commit_stats)
-    session.commit()
-
-
-def calculate_daily_stats(db_session):
-    day = None
-    lines_changed = []
-    changed_chars = []
-    commits_time = []
-    commits_messages_len = []
-    added_files = []
-    modified_files = []
-    removed_files = []
-    devs_id = db_session.query(Developer.id).all()
-    for dev_id in devs_id:
-        commits = db_session.query(Commits).filter_by(developer_id=dev_id[0]).order_by(desc(Commits.day)).all()
-        for commit in commits:
-            if day is None:
-                day = commit.day
-            elif day is not None and day != commit.day:
-                daily_commit_stats(db_session, day, dev_id[0], lines_changed, changed_chars, commits_time,
-                                   commits_messages_len, added_files, modified_files, removed_files)
-                day = commit.day
-                lines_changed = []
-                changed_chars = []
-                commits_time = []
-                commits_messages_len = []
-                added_files = []
-                modified_files = []
-                removed_files = []
-            lines_changed.append(commit.new_lines + commit.removed_lines)
-            commits_time.append(commit.timestamp)
-            commits_messages_len.append(len(commit.message))
-            changed_chars.append(commit.changed_chars)
-            added_files.append(commit.added_files)
-            modified_files.append(commit.modified_files)
-            removed_files.append(commit.removed_files)
-        daily_commit_stats(db_session, day, dev_id[0], lines_changed, changed_chars, commits_time, commits_messages_len,
-                           added_files, modified_files, removed_files)
-
-
-def get_commits(owner, repo, dev, db_session):
-    page = 1
+    added_files_mean, added_files_var = get_mean_and_variance([commit.added_files for commit in commits])
+    modified_files_mean, modified_files_var = get_mean_and_variance([commit.modified_files for commit in commits])
+    removed_files_mean, removed_files_var = get_mean_and_variance([commit.removed_files for commit in commits])
+    return dict(date=date, number_commits=len(commits), time_intervals_min=min(commits_time),
+                time_intervals_max=max(commits_time), time_intervals_mean=times_mean, time_intervals_var=times_variance,
+                changed_lines_min=min(lines_changed), changed_lines_max=max(lines_changed),
+                changed_lines_mean=lines_mean, changed_lines_var=lines_variance, changed_chars_min=min(changed_chars),
+                changed_chars_max=max(changed_chars), changed_chars_mean=chars_mean, changed_chars_var=chars_variance,
+                comments_size_min=min(commits_messages_len), comments_size_max=max(commits_messages_len),
+                comments_size_mean=comments_size_mean, comments_size_var=comments_size_var,
+                added_files_mean=added_files_mean, added_files_var=added_files_var,
+                modified_files_mean=modified_files_mean, modified_files_var=modified_files_var,
+                removed_files_mean=removed_files_mean, removed_files_var=removed_files_var, developer_id=developer_id)
+
+
+def calculate_daily_stats(db_session, start=None, end=None):
+    """
+    Rebuild the daily CommitsStats from the commits, streamed in (developer, day) order.
+
+    Parameters
+    ----------
+    db_session : sqlalchemy.orm.Session
+        DB session used in ORM related operations
+    start : datetime.date
+        First day to rebuild, all days when None
+    end : datetime.date
+        Last day to rebuild (inclusive), all days when None
+    """
+    commits = db_session.query(Commits.developer_id, Commits.day, Commits.timestamp, Commits.new_lines,
+                               Commits.removed_lines, Commits.changed_chars,
+                               func.coalesce(func.length(Commits.message), 0).label('message_length'),
+                               Commits.added_files, Commits.modified_files, Commits.removed_files)\
+        .filter(Commits.developer_id.isnot(None))
+    old_stats = db_session.query(CommitsStats)
+    if start:
+        commits = commits.filter(Commits.day >= start)
+        old_stats = old_stats.filter(CommitsStats.date >= start)
+    if end:
+        commits = commits.filter(Commits.day <= end)
+        old_stats = old_stats.filter(CommitsStats.date <= end)
+    old_stats.delete(synchronize_session=False)
+    commits = commits.order_by(Commits.developer_id, desc(Commits.day), desc(Commits.timestamp)).yield_per(1000)
+    stats = [daily_commit_stats(day, developer_id, list(day_commits))
+             for (developer_id, day), day_commits in groupby(commits, key=lambda commit: (commit[0], commit[1]))]
+    if stats:
+        db_session.execute(CommitsStats.__table__.insert(), stats)
+    db_session.commit()
+
+
+def save_commit(commit_data, dev, writer):
+    """
+    Buffer a commit detail payload with its file changes in the bulk writer.
+
+    Parameters
+    ----------
+    commit_data : dict
+        Commit detail payload, as returned by the commits endpoint
+    dev : Developer
+        Author of the commit
+    writer : BulkWriter
+        Writer buffering the rows, its file index resolves the files changed by the commit
+
+    Returns
+    -------
+    dict
+        Buffered commit row or None if a commit with the same SHA was already stored
+    """
+    # Pages re-read after a crash or overlapping the since mark are already stored
+    if writer.has_commit(commit_data['sha']):
+        return None
+    commit_timestamp = commit_data['commit']['author']['date']
+    commit_timestamp = datetime.fromisoformat(commit_timestamp[:-1])
+    commit = {'sha': commit_data['sha'], 'timestamp': commit_timestamp, 'day': commit_timestamp.date(),
+              'new_lines': commit_data['stats']['additions'], 'removed_lines': commit_data['stats']['deletions'],
+              'message': commit_data['commit']['message'], 'developer_id': dev.id}
+    associations = save_file_changes(commit_data, commit, dev, writer.file_index)
+    return writer.add_commit(commit, associations)
+
+
+def store_commit(commit_data, dev, db_session):
+    """
+    Store a single commit (e.g. accepted by the webhook), updating the stats with it.
+
+    Only the files touched by the commit are loaded in the file index.
+    """
+    filenames = []
+    for file_data in commit_data['files']:
+        filenames.append(file_data['filename'])
+        if 'previous_filename' in file_data:
+            filenames.append(file_data['previous_filename'])
+    writer = BulkWriter(db_session, FileIndex(db_session, filenames), preload_shas=False)
+    commit = save_commit(commit_data, dev, writer)
+    writer.flush()
+    return commit
+
+
+def fetch_commit_details(commit_ref):
+    """
+    Fetch the detail payloads needed to store one entry of the commits listing.
+
+    Parameters
+    ----------
+    commit_ref : dict
+        Entry of the repository commits listing
+
+    Returns
+    -------
+    list
+        Detail payload of the commit or, for a merge, the detail payload of each parent
+    """
+    if len(commit_ref['parents']) > 1:
+        return [api_get(parent['url']) for parent in commit_ref['parents']]
+    return [api_get(commit_ref['url'])]
+
+
+def get_commits(owner, repo, dev, db_session, incremental=False, writer=None):
+    """
+    Store the commits of a developer, checkpointing the listing page so an interrupted sync resumes where it stopped.
+
+    Parameters
+    ----------
+    owner : string
+        Repository owner
+    repo : string
+        Repository name
+    dev : Developer
+        Developer whose commits are listed
+    db_session : sqlalchemy.orm.Session
+        DB session used in ORM related operations
+    incremental : bool
+        Only request commits newer than the high-water mark stored by the last completed sync
+    writer : BulkWriter
+        Writer of the commit rows, shared between developers (created if not given)
+    """
+    if writer is None:
+        writer = BulkWriter(db_session, FileIndex(db_session))
+    sync_state = db_session.get(SyncState, dev.id)
+    if not sync_state:
+        sync_state = SyncState(developer_id=dev.id)
+        db_session.add(sync_state)
+    page = sync_state.page or 1
     author = dev.username
-    while True:
-        r = req_session.get(
-            API_URL + 'repos/{}/{}/commits?author={}&per_page=100&page={}'.format(owner, repo, author, page))
-        print('Page %s' % page, end='\r')
-        page += 1
-        data = r.json()
-        if not data:
-            break
-        for tmp in data:
-            # Check if a merge occurred and act accordingly
-            if len(tmp['parents']) > 1:
-                for parent in tmp['parents']:
-                    url = parent['url']
-                    commit_data = req_session.get(url).json()
-                    if not commit_data['author']:
-                        continue
-                    username = commit_data['author']['login']
-                    developer = get_developer(username, db_session)
-                    if developer == None:
+    url = API_URL + 'repos/{}/{}/commits?author={}&per_page=100'.format(owner, repo, author)
+    if incremental and sync_state.last_commit_timestamp:
+        url += '&since=' + sync_state.last_commit_timestamp.isoformat() + 'Z'
+    # Pending changes (the sync state) are only written by the writer flushes, a flush before the developer queries
+    # would keep a write transaction open while the rest of the page details are fetched
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor, db_session.no_autoflush:
+        while True:
+            data = api_get(url + '&page={}'.format(page))
+            print('Page %s' % page, end='\r')
+            page += 1
+            if not data:
+                break
+            # Details are fetched concurrently, map keeps the listing order so the writes stay deterministic
+            for tmp, details in zip(data, executor.map(fetch_commit_details, data)):
+                # Check if a merge occurred and act accordingly
+                if len(tmp['parents']) > 1:
+                    commit_data = None
+                    for parent_data in details:
+                        if not parent_data['author']:
+                            continue
+                        username = parent_data['author']['login']
+                        developer = get_developer(username, db_session)
+                        if developer == None:
+                            continue
+                        commit_data = parent_data
+                        dev_tmp = developer
+                    if commit_data is None:
                         continue
-                    dev_tmp = developer
-                    developer_id = developer.id
-            else:
-                url = tmp['url']
-                commit_data = req_session.get(url).json()
-                dev_tmp = dev
-                developer_id = dev.id
-
-            commit_timestamp = commit_data['commit']['author']['date']
-            commit_timestamp = datetime.fromisoformat(commit_timestamp[:-1])
-            new_lines = commit_data['stats']['additions']
-            removed_lines = commit_data['stats']['deletions']
-            commit_message = commit_data['commit']['message']
-            commit = Commits(timestamp=commit_timestamp, day=commit_timestamp.date(), new_lines=new_lines,
-                             message=commit_message, removed_lines=removed_lines, developer_id=developer_id)
-            db_session.add(commit)
-            db_session.flush()
-            commit.changed_chars, commit.added_files, commit.modified_files, commit.removed_files, commit.renamed_files\
-                = save_file_changes(commit_data, commit, db_session, dev_tmp)
-            db_session.add(commit)
-        if len(data) < 100:
-            break
-        db_session.commit()
+                else:
+                    commit_data = details[0]
+                    dev_tmp = dev
+
+                commit = save_commit(commit_data, dev_tmp, writer)
+                if commit and (sync_state.pending_commit_timestamp is None or
+                               commit['timestamp'] > sync_state.pending_commit_timestamp):
+                    sync_state.pending_commit_timestamp = commit['timestamp']
+                    sync_state.pending_commit_sha = commit['sha']
+            # The page and its checkpoint are written in a single transaction
+            sync_state.page = page
+            writer.flush()
+            if len(data) < 100:
+                break
+    # The sync is complete, move the high-water mark to the newest commit it stored (including pages stored before a
+    # resume) and clear the checkpoint. Commits stored otherwise (e.g. accepted by the webhook) do not move it, as older
+    # commits (e.g. rejected by the webhook) may be missing.
+    if sync_state.pending_commit_timestamp and (sync_state.last_commit_timestamp is None or
+                                                sync_state.pending_commit_timestamp > sync_state.last_commit_timestamp):
+        sync_state.last_commit_timestamp = sync_state.pending_commit_timestamp
+        sync_state.last_commit_sha = sync_state.pending_commit_sha
+    sync_state.pending_commit_timestamp = None
+    sync_state.pending_commit_sha = None
+    sync_state.page = None
+    db_session.commit()
 
 
 def create_user(username, contributions, db_session):
-    r = req_session.get(API_URL + 'users/' + username)
+    response = api_get(API_URL + 'users/' + username)
     print('Creating user %s' % username, end='\033[K\r')
-    response = r.json()
     dev = Developer(username=response['login'], contributions=contributions,
                     account_creation=datetime.fromisoformat(response['created_at'][:-1]),
                     follower_number=response['followers'])
     db_session.add(dev)
-    db_session.commit()
 
 
 def get_contributors(owner, repo, db_session):
@@ -254,11 +338,11 @@ def get_contributors(owner, repo, db_session):
     """
     page = 1
     while True:
-        r = req_session.get(API_URL + 'repos/{}/{}/contributors?per_page=100&page={}'.format(owner, repo, page))
+        data = api_get(API_URL + 'repos/{}/{}/contributors?per_page=100&page={}'.format(owner, repo, page))
         page += 1
-        data = r.json()
         for tmp in data:
             create_user(tmp['login'], tmp['contributions'], db_session)
+        db_session.commit()
         if len(data) < 100:
             break
 
@@ -267,11 +351,10 @@ def get_pulls(owner, repo, db_session):
     # diff url (https://patch-diff.githubusercontent.com/raw/torvalds/linux/pull/805.diff)
     page = 1
     while True:
-        r = req_session.get(API_URL + 'repos/{}/{}/pulls?state=all&per_page=100&page={}'.format(owner, repo, page))
+        data = api_get(API_URL + 'repos/{}/{}/pulls?state=all&per_page=100&page={}'.format(owner, repo, page))
         page += 1
-        data = r.json()
         for pull in data:
-            tmp_pull = req_session.get(pull['url']).json()
+            tmp_pull = api_get(pull['url'])
             dev = get_developer(pull['user']['login'], db_session)
             pull_obj = Pull(merged=tmp_pull['merged'], state=tmp_pull['state'], author=dev)
             db_session.add(pull_obj)
@@ -281,107 +364,4 @@ def get_pulls(owner, repo, db_session):
 
 
 def get_languages(owner, repo):
-    r = req_session.get(API_URL + 'repos/{}/{}/languages'.format(owner, repo))
-    print(r.json())
-
-
-def calculate_lines_variance_dev(session, attr, dev):
-    query = f'''SELECT 
-    SUM(({attr}-(SELECT AVG({attr}) FROM commits JOIN developer ON developer_id = developer.id WHERE developer_id = {dev}))
-    *({attr}-(SELECT AVG({attr}) FROM commits JOIN developer ON developer_id = developer.id WHERE developer_id = {dev}))) / (COUNT({attr})-1) 
-    AS Variance FROM commits JOIN developer ON developer_id = developer.id WHERE developer_id = {dev}
-    '''
-    to_execute = sqlalchemy.text(query)
-    cursor = session.execute(to_execute)
-    return cursor.fetchall()[0][0]
-
-
-def calculate_lines_variance_repo(session, attr):
-    query = f'''SELECT SUM(({attr}-(SELECT AVG({attr}) FROM commits))*({attr}-(SELECT AVG({attr}) FROM commits))) 
-    / (COUNT({attr})-1) AS Variance FROM commits
-    '''
-    to_execute = sqlalchemy.text(query)
-    cursor = session.execute(to_execute)
-    return cursor.fetchall()[0][0]
-
-
-def calculate_files_variance_dev(session, attr, dev):
-    query = f'''
-    SELECT SUM(({attr}-(SELECT AVG({attr}) FROM commits JOIN developer ON developer_id = developer.id WHERE developer_id = {dev}))*
-    ({attr}-(SELECT AVG({attr}) FROM commits JOIN developer ON developer_id = developer.id WHERE developer_id = {dev})))
-     / (COUNT({attr})-1) AS Variance FROM commits JOIN developer ON developer_id = developer.id WHERE developer_id = {dev}
-    '''
-    to_execute = sqlalchemy.text(query)
-    cursor = session.execute(to_execute)
-    return cursor.fetchall()[0][0]
-
-
-def calculate_files_variance_repo(session, attr):
-    query = f'''SELECT SUM(({attr}-(SELECT AVG({attr}) FROM commits))*({attr}-(SELECT AVG({attr}) FROM commits))) 
-    / (COUNT({attr})-1) AS Variance FROM commits
-    '''
-    to_execute = sqlalchemy.text(query)
-    cursor = session.execute(to_execute)
-    return cursor.fetchall()[0][0]
-
-
-def calculate_global_dev_stats(session, dev_id):
-    new_lines_var = calculate_lines_variance_dev(session, 'new_lines', dev_id)
-    removed_lines_var = calculate_lines_variance_dev(session, 'removed_lines', dev_id)
-    added_files_var = calculate_files_variance_dev(session, 'added_files', dev_id)
-    modified_files_var = calculate_files_variance_dev(session, 'modified_files', dev_id)
-    removed_files_var = calculate_files_variance_dev(session, 'removed_files', dev_id)
-    new_lines_var = new_lines_var if new_lines_var else 0
-    removed_lines_var = removed_lines_var if removed_lines_var else 0
-    added_files_var = added_files_var if added_files_var else 0
-    modified_files_var = modified_files_var if modified_files_var else 0
-    removed_files_var = removed_files_var if removed_files_var else 0
-    dev_stats = DeveloperStats()
-    dev_stats.developer_id = dev_id
-    dev_stats.new_lines_avg = session.query(func.avg(Commits.new_lines)).join(Developer).filter(Developer.id == dev_id).one()[0]
-    dev_stats.new_lines_std = math.sqrt(new_lines_var)
-    dev_stats.new_lines_var = new_lines_var
-    dev_stats.removed_lines_avg = session.query(func.avg(Commits.removed_lines)).join(Developer).filter(
-                Developer.id == dev_id).one()[0]
-    dev_stats.removed_lines_std = math.sqrt(removed_lines_var)
-    dev_stats.removed_lines_var = removed_lines_var
-    dev_stats.added_files_avg = session.query(func.avg(Commits.added_files)).join(Developer).filter(
-                Developer.id == dev_id).one()[0]
-    dev_stats.added_files_var = added_files_var
-    dev_stats.added_files_std = math.sqrt(added_files_var)
-    dev_stats.modified_files_avg = session.query(func.avg(Commits.modified_files)).join(Developer).filter(
-                Developer.id == dev_id).one()[0]
-    dev_stats.modified_files_var = modified_files_var
-    dev_stats.modified_files_std = math.sqrt(modified_files_var)
-    dev_stats.removed_files_avg = session.query(func.avg(Commits.removed_files)).join(Developer).filter(
-                Developer.id == dev_id).one()[0]
-    dev_stats.removed_files_var = removed_files_var
-    dev_stats.removed_files_std = math.sqrt(removed_files_var)
-    session.add(dev_stats)
-    session.commit()
-
-
-def calculate_repo_stats(session):
-    repo_new_lines_var = calculate_lines_variance_repo(session, 'new_lines')
-    repo_removed_lines_var = calculate_lines_variance_repo(session, 'removed_lines')
-    repo_added_files_var = calculate_files_variance_repo(session, 'added_files')
-    repo_modified_files_var = calculate_files_variance_repo(session, 'modified_files')
-    repo_removed_files_var = calculate_files_variance_repo(session, 'removed_files')
-    repo_stats = RepoStats()
-    repo_stats.new_lines_avg = session.query(func.avg(Commits.new_lines)).one()[0]
-    repo_stats.new_lines_var = repo_new_lines_var
-    repo_stats.new_lines_std = math.sqrt(repo_new_lines_var)
-    repo_stats.removed_lines_avg = session.query(func.avg(Commits.removed_lines)).one()[0]
-    repo_stats.removed_lines_var = repo_removed_lines_var
-    repo_stats.removed_lines_std = math.sqrt(repo_removed_lines_var)
-    repo_stats.added_files_avg = session.query(func.avg(Commits.added_files)).one()[0]
-    repo_stats.added_files_var = repo_added_files_var
-    repo_stats.added_files_std = math.sqrt(repo_added_files_var)
-    repo_stats.modified_files_avg = session.query(func.avg(Commits.modified_files)).one()[0]
-    repo_stats.modified_files_var = repo_modified_files_var
-    repo_stats.modified_files_std = math.sqrt(repo_modified_files_var)
-    repo_stats.removed_files_avg = session.query(func.avg(Commits.removed_files)).one()[0]
-    repo_stats.removed_files_var = repo_removed_files_var
-    repo_stats.removed_files_std = math.sqrt(repo_removed_files_var)
-    session.add(repo_stats)
-    session.commit()
+    print(api_get(API_URL + 'repos/{}/{}/languages'.format(owner, repo)))
@@ -0,0 +1,57 @@
+from models import Verdict
+
+import threading
+import queue
+
+
+class VerdictSink:
+    """
+    Buffered writer of the commit verdicts to the verdict table.
+
+    Verdicts are queued by the request path and written in batches by a background thread, with one executemany
+    insert per batch.
+    """
+
+    def __init__(self, session_factory, batch_size=100, interval=1.0):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = queue.Queue()
+        threading.Thread(target=self.work, daemon=True).start()
+
+    def record(self, verdict):
+        """
+        Queue a Verdict row (dict) to be written.
+        """
+        self.queue.put(verdict)
+
+    def work(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get(timeout=self.interval))
+            except queue.Empty:
+                pass
+            try:
+                with self.session_factory() as session:
+                    session.execute(Verdict.__table__.insert(), batch)
+                    session.commit()
+            except Exception as e:
+                print('Could not write %s verdicts: %s' % (len(batch), e))
+
+
+def query_verdicts(session, username=None, since=None, until=None, trusted=None, limit=100):
+    """
+    Get the most recent verdicts, optionally filtered by user, commit time range (naive UTC datetimes) and trusted flag.
+    """
+    query = session.query(Verdict)
+    if username:
+        query = query.filter(Verdict.username == username)
+    if since:
+        query = query.filter(Verdict.timestamp >= since)
+    if until:
+        query = query.filter(Verdict.timestamp <= until)
+    if trusted is not None:
+        query = query.filter(Verdict.trusted == trusted)
+    return query.order_by(Verdict.timestamp.desc()).limit(limit).all()
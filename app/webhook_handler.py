@@ -1,10 +1,24 @@
-import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+import configparser
+import datetime
+import time
 import json
+import math
 
 from flask import Flask, request
-from sqlalchemy import create_engine
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
-from rule_check import *
+from baselines import commit_metrics
+from db import get_engine
+from dev_profile import DeveloperProfile, RepoProfile
+from job_queue import JobQueue
+from migrations import upgrade_schema
+from model_registry import ModelRegistry
+from rule_check import rule_config, rules_violated
+from rule_engine import rule_needs
+from stats_engine import STATS_ATTRIBUTES
+from verdict_sink import VerdictSink, query_verdicts
+import utils
 
 
 app = Flask(__name__)
@@ -13,41 +27,170 @@ app = Flask(__name__)
 config = configparser.ConfigParser()
 config.read('config.ini')
 # Database configuration
-DB_NAME = config['Database']['DB_Name']
-db_engine = create_engine('sqlite:///' + DB_NAME)
+db_engine = get_engine()
 DBSession = sessionmaker(bind=db_engine)
+# Read-only requests use their own pool, so they are not queued behind the job workers
+ReadSession = sessionmaker(bind=get_engine(read_only=True))
+upgrade_schema(db_engine)
+FORGED_COMMITS_DB = 'sqlite:///simulations/results/forged_commits-dum-domi.db'
+GROUP_BY_AUTHOR = config.getboolean('Webhook', 'Group_By_Author', fallback=False)
 
 
-def write_file(commit, violations):
-    username = commit['author']['username']
-    filename = 'reports/report_' + username + '_' + commit['id']
-    with open(filename, 'a') as f:
-        f.write('Commit: ' + commit['id'] + '\n\n')
-        f.write('URL: ' + commit['url'] + '\n\n')
-        f.write('Authored on ' + commit['timestamp'] + ' by ' + commit['author']['name'] + '\n')
-        f.write('Committed on ' + commit['timestamp'] + ' by ' + commit['committer']['name'] + '\n')
-        f.write('Commit Message: ' + commit['message'] + '\n\n')
-        f.write('This commit added ' + str(len(commit['added'])) + ' files.\n')
-        f.write('This commit modified ' + str(len(commit['modified'])) + ' files.\n')
-        f.write('This commit removed ' + str(len(commit['removed'])) + ' files.\n\n')
-        f.write(username + ' is ' + ('TRUSTED\n\n' if violations[1] else 'NOT TRUSTED\n\n'))
-        f.write('This commit violated ' + str(violations[0]) + '% of the rules.\n')
+def process_push(session, payload):
+    """
+    Evaluate every commit of a push payload, run by the job queue workers.
+
+    The commit details are fetched concurrently and the developer and repository profiles are loaded once per push.
+    With Group_By_Author, the files touched by the previous commits of the same author in the push are also taken
+    into account.
+
+    Returns
+    -------
+    list
+        One verdict per commit
+    """
+    commits = payload['commits']
+    with ThreadPoolExecutor(max_workers=utils.MAX_WORKERS) as executor:
+        commits_data = list(executor.map(lambda commit: utils.get_commit_info(commit['url']), commits))
+    rule_values = rule_config.snapshot()
+    repo = RepoProfile(session)
+    profiles = {}
+    for commit in commits:
+        username = commit['author']['username']
+        if username not in profiles:
+            profiles[username] = DeveloperProfile(session, username, repo, rule_needs(rule_values))
+    # Deviations of every commit of the push from the baselines, in standard deviations, scored at once and shared
+    # with the outlier rule
+    developer_deviations, repo_deviations = repo.baselines.deviations(
+        [profiles[commit['author']['username']].dev_id for commit in commits], commit_metrics(commits_data))
+    author_touched_files = {}
+    verdicts = []
+    for i, (commit, commit_data) in enumerate(zip(commits, commits_data)):
+        username = commit['author']['username']
+        touched_files = set(commit['removed'] + commit['modified'])
+        if GROUP_BY_AUTHOR:
+            touched_files = author_touched_files.setdefault(username, set())
+            touched_files.update(commit['removed'] + commit['modified'])
+        start_time = time.time()
+        outcomes = {}
+        violations = rules_violated(session, username, commit['added'], set(touched_files),
+                                    commit['timestamp'][:10], commit_data, profiles[username], outcomes,
+                                    (developer_deviations[i:i + 1], repo_deviations[i:i + 1]))
+        evaluation_time = time.time() - start_time
+        # Accepted commits become part of the developer and repository baselines
+        accepted = violations[1] and violations[0] < rule_values.accepted_violations
+        dev = profiles[username].developer
+        if accepted and dev:
+            utils.store_commit(commit_data, dev, session)
+        verdict_sink.record({'commit_sha': commit['id'], 'username': username,
+                             'timestamp': datetime.datetime.fromisoformat(commit['timestamp']).astimezone(
+                                 datetime.timezone.utc).replace(tzinfo=None),
+                             'created_at': datetime.datetime.utcnow(), 'violated': violations[0],
+                             'trusted': violations[1], 'accepted': bool(accepted and dev),
+                             'rules': json.dumps(outcomes), 'evaluation_time': evaluation_time})
+        verdicts.append({'commit': commit['id'], 'username': username, 'violated': violations[0],
+                         'trusted': violations[1], 'rules': outcomes,
+                         'behaviour': model_registry.score(session, profiles[username].dev_id, [commit_data]),
+                         'deviations': {'developer': deviation_values(developer_deviations[i]),
+                                        'repo': deviation_values(repo_deviations[i])}})
+    return verdicts
+
+
+def deviation_values(deviations):
+    """
+    Get the deviations of a commit by attribute as valid JSON values: None without a baseline (NaN) and 'inf' or
+    '-inf' from a constant baseline.
+    """
+    values = {}
+    for attr, value in zip(STATS_ATTRIBUTES, deviations.tolist()):
+        if math.isnan(value):
+            value = None
+        elif math.isinf(value):
+            value = 'inf' if value > 0 else '-inf'
+        values[attr] = value
+    return values
+
+
+verdict_sink = VerdictSink(DBSession)
+# Developer behaviour models, trained on first use and kept on disk
+model_registry = ModelRegistry()
+job_queue = JobQueue(DBSession, process_push, config.getint('Webhook', 'Workers', fallback=4), ReadSession)
+
+
+def valid_commit(commit):
+    """
+    Check that a commit of a push payload has every field used by process_push.
+
+    GitHub leaves out author.username when the author email is not linked to an account.
+    """
+    if not isinstance(commit, dict) or not isinstance(commit.get('author'), dict) or \
+            not isinstance(commit['author'].get('username'), str):
+        return False
+    if not all(isinstance(commit.get(field), str) for field in ('id', 'url', 'timestamp')):
+        return False
+    try:
+        datetime.datetime.fromisoformat(commit['timestamp'])
+    except ValueError:
+        return False
+    return all(isinstance(commit.get(field), list) for field in ('added', 'removed', 'modified'))
 
 
 @app.route('/push-payload', methods=['POST'])
 def push_payload():
-    payload = request.get_json()
-    if 'commits' not in payload:
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return '', 400
+    commits = payload.get('commits')
+    if not commits:
         return '', 201
-    touched_files = set()
-    with DBSession() as session:
-        for commit in payload['commits']:
-            # My rules (lines changed, time...)
-            commit_data = utils.get_commit_info(commit['url'])
-            username = commit['author']['username']
-            touched_files.update(commit['removed'] + commit['modified'])
-        write_file(commit, rules_violated(session, username, commit['added'], touched_files, commit['timestamp'][:10], commit_data))
-    return '', 201
+    # Rejected before queueing, a single invalid commit would fail the whole job
+    if not isinstance(commits, list) or not all(valid_commit(commit) for commit in commits):
+        return '', 400
+    return {'job': job_queue.submit(payload)}, 202
+
+
+@app.route('/jobs')
+def get_jobs_stats():
+    return job_queue.stats()
+
+
+@app.route('/jobs/<int:job_id>')
+def get_job(job_id):
+    job = job_queue.status(job_id)
+    if job is None:
+        return '', 404
+    return job
+
+
+def parse_time(value):
+    """
+    Parse an ISO 8601 query argument into a naive UTC datetime, as the stored verdict timestamps, None when missing.
+    """
+    if not value:
+        return None
+    # fromisoformat does not accept a trailing Z before Python 3.11
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+@app.route('/verdicts')
+def get_verdicts():
+    trusted = request.args.get('trusted')
+    try:
+        since, until = parse_time(request.args.get('since')), parse_time(request.args.get('until'))
+    except ValueError:
+        return '', 400
+    with ReadSession() as session:
+        verdicts = query_verdicts(session, request.args.get('user'), since, until,
+                                  None if trusted is None else trusted == 'true',
+                                  request.args.get('limit', 100, type=int))
+        return {'verdicts': [{'commit': verdict.commit_sha, 'username': verdict.username,
+                              'timestamp': str(verdict.timestamp), 'violated': verdict.violated,
+                              'trusted': verdict.trusted, 'accepted': verdict.accepted,
+                              'rules': json.loads(verdict.rules), 'evaluation_time': verdict.evaluation_time}
+                             for verdict in verdicts]}
 
 
 @app.route('/pull-payload', methods=['POST'])
@@ -59,14 +202,15 @@ def pull_payload():
 
 @app.route('/commit/<commit_id>')
 def get_commit(commit_id):
-    # con = sqlite3.connect('simulations/forged_commits.db')
-    con = sqlite3.connect('simulations/results/forged_commits-dum-domi.db')
-    cursor = con.cursor()
-    cursor.execute('SELECT commit_data FROM forged_commits WHERE id = ?', (commit_id,))
-    return json.loads(cursor.fetchall()[0][0])
+    # FORGED_COMMITS_DB = 'sqlite:///simulations/forged_commits.db'
+    with get_engine(FORGED_COMMITS_DB, read_only=True).connect() as con:
+        result = con.execute(text('SELECT commit_data FROM forged_commits WHERE id = :id'), {'id': commit_id})
+        return json.loads(result.fetchall()[0][0])
 
 
 if __name__ == '__main__':
+    # Jobs left queued by a previous run are processed again
+    job_queue.start()
     # app.run('0.0.0.0', 8080)
     app.run(port=8080)
 